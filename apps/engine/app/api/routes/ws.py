@@ -167,6 +167,10 @@ async def websocket_endpoint(
     """
     heartbeat_task = None
 
+    # Last flow sent on this connection, so clients can send only its hash afterwards
+    cached_flow_data: Optional[Dict[str, Any]] = None
+    cached_flow_hash: Optional[str] = None
+
     try:
         # Accept the WebSocket connection
         await ws_manager.connect(websocket, session_id)
@@ -228,6 +232,7 @@ async def websocket_endpoint(
                             # Handle user message - trigger flow execution
                             user_message = parsed.get("message")
                             flow_data = parsed.get("flow_data")
+                            flow_hash = parsed.get("flow_hash")
 
                             if not user_message:
                                 logger.warning(f"Received user_message without 'message' field: {parsed}")
@@ -238,6 +243,21 @@ async def websocket_endpoint(
                                 })
                                 continue
 
+                            if flow_data:
+                                cached_flow_data, cached_flow_hash = flow_data, flow_hash
+                            elif flow_hash and flow_hash == cached_flow_hash:
+                                flow_data = cached_flow_data
+                            elif flow_hash:
+                                # Unknown hash: ask the client to resend the full flow
+                                logger.debug(f"Flow cache miss for session={session_id}, flow_hash={flow_hash}")
+                                await websocket.send_json({
+                                    "event_type": "flow_miss",
+                                    "session_id": session_id,
+                                    "flow_hash": flow_hash,
+                                    "message": user_message
+                                })
+                                continue
+
                             if not flow_data:
                                 logger.warning(f"Received user_message without 'flow_data' field: {parsed}")
                                 await websocket.send_json({
@@ -7,6 +7,8 @@ from ..models.session import ChatSession
 from ..llm.providers import get_llm
 from .variable_extractor import format_variables_for_prompt
 
+_VARIABLE_RE = re.compile(r'\{\{(\w+)\}\}')
+
 
 def _substitute_variables(text: str, session: ChatSession) -> str:
     """
@@ -19,11 +21,9 @@ def _substitute_variables(text: str, session: ChatSession) -> str:
     Returns:
         Text with variables replaced by their actual values
     """
-    if not text:
+    if not text or '{{' not in text:
         return text
     
-    pattern = r'\{\{(\w+)\}\}'
-    
     def replacer(match):
         var_name = match.group(1)
         value = session.extracted_variables.get(var_name)
@@ -32,7 +32,7 @@ def _substitute_variables(text: str, session: ChatSession) -> str:
         # Keep the original placeholder if variable not found
         return match.group(0)
     
-    return re.sub(pattern, replacer, text)
+    return _VARIABLE_RE.sub(replacer, text)
 
 
 def _format_prompts(flow: Flow, current_node_id: str, session: ChatSession) -> tuple[str, float]:
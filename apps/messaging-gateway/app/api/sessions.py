@@ -5,7 +5,7 @@ from pydantic import BaseModel
 from typing import List, Optional
 import logging
 from datetime import datetime
-from uuid import uuid4
+import secrets
 
 from ..database import get_db
 from ..models import BotConfig, PlatformConversation, ConversationMessage
@@ -264,7 +264,7 @@ async def reset_session(
             raise HTTPException(status_code=404, detail="Bot config not found")
 
         # Generate new session ID (same format as when creating a new conversation)
-        new_session_id = f"{bot_config.platform}-{bot_config.id}-{conversation.platform_user_id}-{uuid4().hex[:8]}"
+        new_session_id = f"{bot_config.platform}-{bot_config.id}-{conversation.platform_user_id}-{secrets.token_hex(4)}"
 
         logger.info(
             f"Resetting session: id={session_id}, "
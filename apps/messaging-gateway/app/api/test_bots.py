@@ -7,8 +7,8 @@ extracted variables for demonstration and testing purposes.
 
 import logging
 import asyncio
+import secrets
 from typing import Optional
-from uuid import uuid4
 from datetime import datetime
 
 from fastapi import APIRouter, HTTPException, Depends
@@ -18,8 +18,14 @@ from sqlalchemy.orm import Session
 from ..database import get_db, settings
 from ..models import BotConfig, PlatformConversation, ConversationMessage
 from ..services.telegram import telegram_service
-from ..services.engine_ws_client import engine_ws_client
-from ..services.variable_storage import persist_variable
+from ..services.engine_ws_client import (
+    CONVERSATION_EVENTS,
+    TERMINAL_EVENTS,
+    ListenerQueue,
+    engine_ws_client,
+)
+from ..services.variable_storage import persist_variables
+from ..utils.jsonlib import loads as json_loads
 from easypath_shared.constants import MessagingPlatform, BotStatus, ConversationMessageRoles
 import httpx
 
@@ -84,7 +90,7 @@ async def create_test_bot(
     """
     try:
         # Generate dummy token for test bot
-        test_token = f"test-token-{uuid4().hex[:16]}"
+        test_token = f"test-token-{secrets.token_hex(8)}"
 
         # Create bot config with test flag
         new_bot = BotConfig(
@@ -210,7 +216,7 @@ async def send_test_message(
 
         if not conversation:
             # Create new conversation with unique session ID
-            session_id = f"test-{request.bot_id}-{request.persona_user_id}-{uuid4().hex[:8]}"
+            session_id = f"test-{request.bot_id}-{request.persona_user_id}-{secrets.token_hex(4)}"
             conversation = PlatformConversation(
                 bot_config_id=request.bot_id,
                 platform_user_id=request.persona_user_id,
@@ -218,8 +224,8 @@ async def send_test_message(
                 session_id=session_id
             )
             db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
+            # The INSERT returns the id; the conversation is committed with the messages
+            db.flush()
             logger.info(f"Created test conversation: {conversation.id}, session={session_id}")
 
         # Load flow from platform database
@@ -316,7 +322,7 @@ async def _get_flow_from_platform(flow_id: int) -> Optional[dict]:
                 return None
 
             response.raise_for_status()
-            flow_data = response.json()
+            flow_data = json_loads(response.content)
 
             logger.info(f"Flow data received: keys={list(flow_data.keys())}")
             logger.debug(f"Full flow data: {flow_data}")
@@ -377,8 +383,9 @@ async def _process_test_message_with_engine(
 
         # Wait for WebSocket task to complete (with timeout)
         try:
-            await asyncio.wait_for(ws_task, timeout=60.0)
-        except asyncio.TimeoutError:
+            async with asyncio.timeout(60.0):
+                await ws_task
+        except TimeoutError:
             logger.warning(f"WebSocket task timeout for test session {session_id}")
             ws_task.cancel()
 
@@ -404,6 +411,25 @@ async def _process_test_message_with_engine(
             logger.debug(f"Error closing WebSocket connection: {e}")
 
 
+async def _persist_test_variables(
+    db: Session,
+    conversation: PlatformConversation,
+    bot_config: BotConfig,
+    pending_variables: list
+):
+    """Write and clear the buffered test variable extractions"""
+    try:
+        await persist_variables(
+            db=db,
+            conversation_id=conversation.id,
+            flow_id=bot_config.flow_id,
+            variables=pending_variables
+        )
+    except Exception as e:
+        logger.error(f"Failed to persist test variables: {e}", exc_info=True)
+    pending_variables.clear()
+
+
 async def _handle_websocket_events_for_test(
     session_id: str,
     conversation: PlatformConversation,
@@ -418,20 +444,19 @@ async def _handle_websocket_events_for_test(
     simplified for test mode (no Telegram API calls).
     """
     queue = None
+    pending_variables = []  # Extracted variables not yet written
 
     try:
         logger.info(f"🎧 Starting to collect events for test session: {session_id}")
 
         # Create queue and register it manually (like telegram.py line 545-549)
-        queue = asyncio.Queue()
+        queue = ListenerQueue(event_types=CONVERSATION_EVENTS)
 
-        if session_id not in engine_ws_client._message_queues:
-            engine_ws_client._message_queues[session_id] = []
-        engine_ws_client._message_queues[session_id].append(queue)
+        total_listeners = engine_ws_client.register_listener(session_id, queue)
 
         logger.info(
             f"🔔 Registered event handler for test session={session_id}, "
-            f"total_listeners={len(engine_ws_client._message_queues[session_id])}"
+            f"total_listeners={total_listeners}"
         )
 
         # Ensure connection exists
@@ -439,6 +464,11 @@ async def _handle_websocket_events_for_test(
 
         # Read events from queue (blocking wait, no timeout)
         while True:
+            # Variables that arrived together are written in one statement,
+            # before waiting for more events
+            if pending_variables and queue.empty():
+                await _persist_test_variables(db, conversation, bot_config, pending_variables)
+
             event = await queue.get()
 
             # Check for sentinel value (connection closed)
@@ -455,39 +485,30 @@ async def _handle_websocket_events_for_test(
                 node_id = event.get("node_id", "unknown")
 
                 if variable_name and variable_value is not None:
-                    try:
-                        logger.info(
-                            f"💾 Persisting test variable: session={session_id}, "
-                            f"variable={variable_name}, value={variable_value}, node={node_id}"
-                        )
-                        await persist_variable(
-                            db=db,
-                            conversation_id=conversation.id,
-                            node_id=node_id,
-                            flow_id=bot_config.flow_id,
-                            variable_name=variable_name,
-                            variable_value=variable_value,
-                            variable_type=type(variable_value).__name__
-                        )
-                        logger.info(f"✅ Test variable persisted: {variable_name}")
-                    except Exception as e:
-                        logger.error(
-                            f"Failed to persist test variable {variable_name}: {e}",
-                            exc_info=True
-                        )
+                    logger.info(
+                        "💾 Persisting test variable: session=%s, variable=%s, value=%s, node=%s",
+                        session_id, variable_name, variable_value, node_id
+                    )
+                    pending_variables.append({
+                        "node_id": node_id,
+                        "variable_name": variable_name,
+                        "variable_value": variable_value,
+                    })
 
             # Collect assistant messages for response
             elif event_type == "assistant_message":
                 message = event.get("message", "")
                 if message:
                     messages_list.append(message)
-                    logger.debug(
-                        f"Collected test message: session={session_id}, total={len(messages_list)}"
-                    )
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(
+                            "Collected test message: session=%s, total=%s",
+                            session_id, len(messages_list)
+                        )
 
             # Break on completion events
-            elif event_type in ("session_ended", "error", "message_processing_complete"):
-                logger.debug(f"Processing complete event: {event_type}")
+            elif event_type in TERMINAL_EVENTS:
+                logger.debug("Processing complete event: %s", event_type)
                 break
 
     except Exception as e:
@@ -498,7 +519,8 @@ async def _handle_websocket_events_for_test(
 
     finally:
         # Cleanup queue registration
-        if queue and session_id in engine_ws_client._message_queues:
-            if queue in engine_ws_client._message_queues[session_id]:
-                engine_ws_client._message_queues[session_id].remove(queue)
-                logger.debug(f"Unregistered event handler for test session={session_id}")
+        if queue is not None:
+            engine_ws_client.unregister_listener(session_id, queue)
+            logger.debug(f"Unregistered event handler for test session={session_id}")
+        if pending_variables:
+            await _persist_test_variables(db, conversation, bot_config, pending_variables)
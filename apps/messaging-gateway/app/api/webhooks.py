@@ -1,24 +1,44 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from telegram import Update
+import asyncio
 import logging
 import httpx
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
 
-from ..database import get_db, SessionLocal
+from ..database import get_db, SessionLocal, settings
 from ..models import BotConfig
-from ..services.telegram import telegram_service
+from ..services.telegram import TelegramTextMessage, telegram_service
 from ..utils.flow_converter import ensure_engine_format
+from ..utils.jsonlib import loads as json_loads
 from easypath_shared.constants import BotStatus, MessagingPlatform
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Caps the updates being processed at once; a webhook only waits here when
+# the gateway is saturated, which also slows Telegram's deliveries down
+_update_slots = asyncio.Semaphore(settings.webhook_max_concurrency)
+# Strong references to running update tasks (the loop only keeps weak ones)
+_update_tasks: set = set()
+
+
+# Flows kept converted to engine format, least recently used first
+FLOW_CACHE_MAX_ENTRIES = 256
+# flow_id -> (flow version, flow in engine format); sharing one dict per
+# version also lets the engine client skip re-serializing the flow
+_engine_flows: "OrderedDict[int, Tuple[Any, Dict[str, Any]]]" = OrderedDict()
+
+
+def _release_update_slot(task: asyncio.Task):
+    _update_tasks.discard(task)
+    _update_slots.release()
+
 
 async def _process_telegram_update_background(
     bot_config: BotConfig,
-    update: Update,
-    flow_data: Dict[str, Any]
+    update: TelegramTextMessage
 ):
     """
     Background task to process Telegram update.
@@ -26,6 +46,12 @@ async def _process_telegram_update_background(
     """
     db = SessionLocal()
     try:
+        # Fetch flow data from platform database, in engine format
+        flow_data = await _fetch_engine_flow(bot_config.flow_id)
+
+        if not flow_data:
+            return
+
         # Process the update
         success = await telegram_service.process_update(
             update=update,
@@ -35,10 +61,10 @@ async def _process_telegram_update_background(
         )
 
         if not success:
-            logger.error(f"Failed to process update in background: bot_id={bot_config.id}")
+            logger.error("Failed to process update in background: bot_id=%s", bot_config.id)
 
     except Exception as e:
-        logger.error(f"Error in background processing: {e}", exc_info=True)
+        logger.error("Error in background processing: %s", e, exc_info=True)
     finally:
         db.close()
 
@@ -47,7 +73,6 @@ async def _process_telegram_update_background(
 async def telegram_webhook(
     bot_config_id: int,
     request: Request,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -60,6 +85,24 @@ async def telegram_webhook(
     URL format: POST /webhooks/telegram/{bot_config_id}
     """
     try:
+        # Get update data from Telegram
+        update_data = json_loads(await request.body())
+        # Only a few message fields are used, so read them from the dict
+        # instead of building the full Update object tree
+        update = TelegramTextMessage.from_update(update_data)
+
+        if update is None:
+            logger.warning("Received update without text message: %s", update_data.get("update_id"))
+            return {"status": "ok", "message": "Received update without text message"}
+
+        if not update.user_id:
+            logger.warning("Received update without from user: %s", update.update_id)
+            return {"status": "error", "message": "Received update without from user"}
+
+        # Drop the backlog Telegram replays after a restart before touching the database
+        if telegram_service.is_stale(update):
+            return {"status": "ok", "message": "Ignored message from before startup"}
+
         # Get bot configuration
         bot_config = db.query(BotConfig).filter(
             BotConfig.id == bot_config_id,
@@ -68,103 +111,110 @@ async def telegram_webhook(
         ).first()
 
         if not bot_config:
-            logger.error(f"Bot config not found or inactive: {bot_config_id}")
-            logger.error(f"Query returned: {bot_config}")
+            logger.error("Bot config not found or inactive: %s", bot_config_id)
             # Return 200 to prevent Telegram retries (error logged internally)
             return {"status": "error", "message": "Bot not found or inactive"}
 
-        # Get update data from Telegram
-        update_data = await request.json()
-        update = Update.de_json(update_data)
-
-        if not update.message or not update.message.text:
-            logger.warning(f"Received update without text message: {update.update_id}")
-            return {"status": "ok", "message": "Received update without text message"}
-
-        if not update.message.from_user:
-            logger.warning(f"Received update without from user: {update.update_id}")
-            return {"status": "error", "message": "Received update without from user"}
+        # Telegram redelivers updates it considers unanswered; run each one once
+        if not telegram_service.claim_update(bot_config_id, update.update_id):
+            logger.info("Ignoring duplicate update: bot_id=%s, update_id=%s", bot_config_id, update.update_id)
+            return {"status": "ok", "message": "Duplicate update"}
 
         logger.info(
-            f"Received Telegram webhook: bot_id={bot_config_id}, "
-            f"user_id={update.message.from_user.id}, "
-            f"message=\"{update.message.text[:100]}\""
+            'Received Telegram webhook: bot_id=%s, user_id=%s, message="%.100s"',
+            bot_config_id, update.user_id, update.text
         )
-        logger.debug(f"Full update data: {update}")
-
-        # Fetch flow data from platform database
-        flow_data = await _fetch_flow_data(bot_config.flow_id)
-
-        if not flow_data:
-            logger.error(f"Flow not found: flow_id={bot_config.flow_id}")
-            # Return 200 to prevent Telegram retries (error logged internally)
-            return {"status": "error", "message": "Flow configuration not found"}
-
-        # Convert flow format if needed (canvas → engine)
-        try:
-            #TODO: Check if I really want the format between platform and engine to be different
-            flow_data = ensure_engine_format(flow_data)
-            logger.debug(f"Flow format validated/converted for flow_id={bot_config.flow_id}")
-        except ValueError as e:
-            logger.error(f"Invalid flow format: flow_id={bot_config.flow_id}, error={str(e)}")
-            # Return 200 to prevent Telegram retries (error logged internally)
-            return {"status": "error", "message": f"Invalid flow format: {str(e)}"}
-
-        # Schedule background processing
-        background_tasks.add_task(
-            _process_telegram_update_background,
-            bot_config=bot_config,
-            update=update,
-            flow_data=flow_data
+        logger.debug("Full update data: %s", update_data)
+
+        # Schedule background processing; the flow is loaded there as well
+        await _update_slots.acquire()
+        task = asyncio.create_task(
+            _process_telegram_update_background(
+                bot_config=bot_config,
+                update=update
+            )
         )
+        _update_tasks.add(task)
+        task.add_done_callback(_release_update_slot)
 
         # Return 200 OK immediately to prevent Telegram retries
-        logger.info(f"Webhook accepted, processing in background: bot_id={bot_config_id}")
+        logger.info("Webhook accepted, processing in background: bot_id=%s", bot_config_id)
         return {"status": "ok"}
 
     except Exception as e:
-        logger.error(f"Error in telegram webhook: {e}", exc_info=True)
+        logger.error("Error in telegram webhook: %s", e, exc_info=True)
         # Always return 200 to prevent Telegram retries (error logged internally)
         return {"status": "error", "message": "Internal server error"}
 
 
-async def _fetch_flow_data(flow_id: int) -> Dict[str, Any] | None:
+async def _fetch_engine_flow(flow_id: int) -> Dict[str, Any] | None:
     """
-    Fetch flow data from the platform database.
+    Fetch a flow from the platform database in engine format.
     This queries the platform's flows table to get the flow definition.
 
+    The converted flow is cached per flow and reused until the flow's
+    updated_at changes, so it must be treated as read-only.
+
     Returns:
-        Flow data dict in engine format, or None if not found
+        Flow data dict in engine format, or None if not found or invalid
     """
     try:
-        # Import here to avoid circular dependency
-        from ..database import settings
-
         # Query the platform database for the flow
         # We'll use the same database connection since it's shared
-        from ..database import SessionLocal
-
         db = SessionLocal()
         try:
-            # Query flows table (from platform backend)
-            from sqlalchemy import text
-
-            query = text("SELECT flow_data FROM flows WHERE id = :flow_id")
-            result = db.execute(query, {"flow_id": flow_id}).fetchone()
-
-            if result:
-                flow_data = result[0]  # flow_data is a JSON column
-                logger.debug(f"Fetched flow data: flow_id={flow_id}")
-                return flow_data
-            else:
-                logger.error(f"Flow not found in database: flow_id={flow_id}")
+            # Query flows table (from platform backend); the version is a
+            # plain column read, the flow document is only loaded when it changed
+            result = db.execute(
+                text("SELECT updated_at FROM flows WHERE id = :flow_id"),
+                {"flow_id": flow_id},
+            ).fetchone()
+
+            if not result:
+                logger.error("Flow not found in database: flow_id=%s", flow_id)
+                return None
+
+            version = result[0]
+            cached = _engine_flows.get(flow_id)
+            if cached is not None and version is not None and cached[0] == version:
+                _engine_flows.move_to_end(flow_id)
+                return cached[1]
+
+            # Read the version again with the document, so a concurrent edit
+            # can't cache new data under the old version
+            result = db.execute(
+                text("SELECT flow_data, updated_at FROM flows WHERE id = :flow_id"),
+                {"flow_id": flow_id},
+            ).fetchone()  # flow_data is a JSON column
+            if not result:
+                logger.error("Flow not found in database: flow_id=%s", flow_id)
                 return None
+            flow_data, version = result
+            logger.debug("Fetched flow data: flow_id=%s", flow_id)
 
         finally:
             db.close()
 
+        if not flow_data:
+            logger.error("Flow not found: flow_id=%s", flow_id)
+            return None
+
+        # Convert flow format if needed (canvas → engine)
+        try:
+            #TODO: Check if I really want the format between platform and engine to be different
+            flow_data = ensure_engine_format(flow_data)
+            logger.debug("Flow format validated/converted for flow_id=%s", flow_id)
+        except ValueError as e:
+            logger.error("Invalid flow format: flow_id=%s, error=%s", flow_id, e)
+            return None
+
+        _engine_flows[flow_id] = (version, flow_data)
+        if len(_engine_flows) > FLOW_CACHE_MAX_ENTRIES:
+            _engine_flows.popitem(last=False)
+        return flow_data
+
     except Exception as e:
-        logger.error(f"Error fetching flow data: {e}", exc_info=True)
+        logger.error("Error fetching flow data: %s", e, exc_info=True)
         return None
 
 
@@ -198,5 +248,5 @@ async def telegram_webhook_info(
         }
 
     except Exception as e:
-        logger.error(f"Error getting webhook info: {e}", exc_info=True)
+        logger.error("Error getting webhook info: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
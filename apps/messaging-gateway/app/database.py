@@ -9,6 +9,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pydantic_settings import BaseSettings
 
+from .utils.jsonlib import dumps as json_dumps, loads as json_loads
+
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +31,9 @@ class Settings(BaseSettings):
     websocket_connection_timeout: float = 10.0  # 10 seconds for connection establishment
     websocket_cleanup_delay: float = 5.0  # 5 seconds delay before cleanup
 
+    # Telegram updates processed at once; further webhooks wait for a free slot
+    webhook_max_concurrency: int = 64
+
     class Config:
         env_file = ".env"
 
@@ -66,7 +71,12 @@ if not settings.webhook_base_url:
             "Telegram webhooks may fail to register."
         )
 
-engine = create_engine(settings.database_url)
+# JSON columns (e.g. flows.flow_data, read on every webhook) go through orjson
+engine = create_engine(
+    settings.database_url,
+    json_serializer=json_dumps,
+    json_deserializer=json_loads,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
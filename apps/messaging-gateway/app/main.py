@@ -49,6 +49,10 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down Messaging Gateway service...")
+    from .services.telegram import telegram_service
+    from .services.engine_client import engine_client
+    await telegram_service.shutdown()
+    await engine_client.close()
 
 
 app = FastAPI(
@@ -92,10 +96,13 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
+        # uvloop has no Windows build
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
         reload=True
     )
@@ -1,22 +1,34 @@
+import base64
+import os
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 
 from cryptography.fernet import Fernet
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from sqlalchemy import (
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     func,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy import Enum as DBEnum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database import Base, settings
+from .types import IntEnumType
 from easypath_shared.constants import (
     BotStatus,
     ConversationMessageRoles,
@@ -26,6 +38,47 @@ from easypath_shared.constants import (
 )
 
 
+# Version prefix for AES-GCM token blobs. Legacy Fernet tokens always start with b"g".
+_TOKEN_VERSION_AESGCM = b"\x01"
+_GCM_NONCE_SIZE = 12
+
+
+def _check_cipher_backend() -> None:
+    """Fail fast if the OpenSSL backend cannot do AES-GCM (tokens) or AES-CBC (legacy Fernet)."""
+    backend = default_backend()
+    key = algorithms.AES(os.urandom(32))
+    if not (
+        backend.cipher_supported(key, modes.GCM(os.urandom(_GCM_NONCE_SIZE)))
+        and backend.cipher_supported(key, modes.CBC(os.urandom(16)))
+    ):
+        raise RuntimeError(
+            "cryptography's OpenSSL backend does not support AES-GCM/AES-CBC; "
+            "install the official cryptography wheel"
+        )
+
+
+_check_cipher_backend()
+
+
+@lru_cache(maxsize=4)
+def _get_fernet(secret_key: str) -> Fernet:
+    """Return a Fernet instance for the given key, used to read legacy tokens."""
+    return Fernet(secret_key.encode())
+
+
+@lru_cache(maxsize=4)
+def _get_aesgcm(secret_key: str) -> AESGCM:
+    """Return an AES-256-GCM cipher whose key is derived from the Fernet-format secret key.
+
+    Fernet splits its 32 bytes into an HMAC key and an AES key, so the GCM key is
+    derived with HKDF rather than reusing that key material directly.
+    """
+    gcm_key = HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"bot-token-aesgcm"
+    ).derive(base64.urlsafe_b64decode(secret_key.encode()))
+    return AESGCM(gcm_key)
+
+
 class BotConfig(Base):
     """Configuration for messaging platform bots (Telegram, WhatsApp, etc.)"""
 
@@ -36,7 +89,7 @@ class BotConfig(Base):
         DBEnum(MessagingPlatform, values_callable=lambda x: [e.value for e in x]), nullable=False
     )
     bot_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    bot_token_encrypted: Mapped[str] = mapped_column(Text, nullable=False)
+    bot_token_encrypted: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
     flow_id: Mapped[int] = mapped_column(
         nullable=False
     )  # References flows.id in platform DB
@@ -44,7 +97,7 @@ class BotConfig(Base):
         nullable=False
     )  # References users.id in platform DB
     is_active: Mapped[BotStatus] = mapped_column(
-        DBEnum(BotStatus, values_callable=lambda x: [e.value for e in x]),
+        IntEnumType(BotStatus),
         default=BotStatus.ACTIVE,
     )
     webhook_url: Mapped[Optional[str]] = mapped_column(
@@ -69,20 +122,28 @@ class BotConfig(Base):
     @property
     def bot_token(self) -> str:
         """Decrypt and return bot token"""
-        f = Fernet(settings.secret_key.encode())
-        return f.decrypt(self.bot_token_encrypted.encode()).decode()
+        blob = self.bot_token_encrypted
+        if blob[:1] != _TOKEN_VERSION_AESGCM:
+            # Token written before the switch to AES-GCM
+            return _get_fernet(settings.secret_key).decrypt(blob).decode()
+        nonce = blob[1:1 + _GCM_NONCE_SIZE]
+        ciphertext = blob[1 + _GCM_NONCE_SIZE:]
+        return _get_aesgcm(settings.secret_key).decrypt(nonce, ciphertext, None).decode()
 
     @bot_token.setter
     def bot_token(self, value: str):
-        """Encrypt and store bot token"""
-        f = Fernet(settings.secret_key.encode())
-        self.bot_token_encrypted = f.encrypt(value.encode()).decode()
+        """Encrypt and store bot token as version || nonce || ciphertext || tag"""
+        nonce = os.urandom(_GCM_NONCE_SIZE)
+        ciphertext = _get_aesgcm(settings.secret_key).encrypt(nonce, value.encode(), None)
+        self.bot_token_encrypted = _TOKEN_VERSION_AESGCM + nonce + ciphertext
 
 
 class PlatformConversation(Base):
     """Tracks conversations between platform users and bots"""
 
     __tablename__ = TableNames.PLATFORM_CONVERSATIONS
+    # Fetch server defaults (created_at, last_message_at) in the INSERT's RETURNING
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     bot_config_id: Mapped[int] = mapped_column(
@@ -98,9 +159,7 @@ class PlatformConversation(Base):
         String, nullable=False
     )  # EasyPath engine session ID
     status: Mapped[PlatformConversationStatus] = mapped_column(
-        DBEnum(
-            PlatformConversationStatus, values_callable=lambda x: [e.value for e in x]
-        ),
+        IntEnumType(PlatformConversationStatus),
         default=PlatformConversationStatus.ACTIVE,
     )
     last_message_at: Mapped[datetime] = mapped_column(
@@ -135,9 +194,7 @@ class ConversationMessage(Base):
         Integer, ForeignKey(f"{TableNames.PLATFORM_CONVERSATIONS}.id"), nullable=False
     )
     role: Mapped[ConversationMessageRoles] = mapped_column(
-        DBEnum(
-            ConversationMessageRoles, values_callable=lambda x: [e.value for e in x]
-        ),
+        IntEnumType(ConversationMessageRoles),
         nullable=False,
     )
     content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -156,6 +213,23 @@ class ExtractedVariable(Base):
     """Variables extracted from user messages during conversations"""
 
     __tablename__ = TableNames.EXTRACTED_VARIABLES
+    # Fetch server defaults (extracted_at) in the INSERT's RETURNING
+    __mapper_args__ = {"eager_defaults": True}
+    # Conflict target of the upserts in variable_storage (see migration 008)
+    # and the per-conversation listing order (see migration 009)
+    __table_args__ = (
+        Index(
+            "uq_extracted_vars_conversation_name",
+            "conversation_id",
+            "variable_name",
+            unique=True,
+        ),
+        Index(
+            "idx_extracted_vars_conversation_time",
+            "conversation_id",
+            text("extracted_at DESC"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     conversation_id: Mapped[int] = mapped_column(
@@ -0,0 +1,37 @@
+"""Custom SQLAlchemy column types."""
+
+from enum import Enum
+from typing import Optional, Type
+
+from sqlalchemy import SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+
+class IntEnumType(TypeDecorator):
+    """
+    Store a Python enum as a SMALLINT.
+
+    Members are numbered from 1 in declaration order, so new members must only
+    ever be appended to the enum (the SQL migrations rely on the same codes).
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_cls: Type[Enum], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Public under the constructor argument's name so SQLAlchemy includes
+        # the enum in the statement cache key (cache_ok = True)
+        self.enum_cls = enum_cls
+        self._to_code = {member: code for code, member in enumerate(enum_cls, start=1)}
+        self._from_code = {code: member for member, code in self._to_code.items()}
+
+    def process_bind_param(self, value, dialect) -> Optional[int]:
+        if value is None:
+            return None
+        return self._to_code[self.enum_cls(value)]
+
+    def process_result_value(self, value, dialect) -> Optional[Enum]:
+        if value is None:
+            return None
+        return self._from_code[value]
@@ -2,9 +2,15 @@ import httpx
 import logging
 from typing import Dict, Any, Optional
 from ..database import settings
+from ..utils.jsonlib import dumps as json_dumps, loads as json_loads
 
 logger = logging.getLogger(__name__)
 
+# Keep-alive connections to the engine, shared by all requests
+ENGINE_HTTP_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=50, keepalive_expiry=60.0
+)
+
 
 class EngineClient:
     """Client for communicating with the EasyPath engine API"""
@@ -13,6 +19,23 @@ class EngineClient:
         self.base_url = settings.engine_api_url
         self.timeout = 60.0  # 60 seconds timeout for LLM responses
         self.clear_timeout = 5.0  # 5 seconds for session clear operations
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=ENGINE_HTTP_LIMITS,
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+            )
+        return self._client
+
+    async def close(self):
+        """Close the shared HTTP client and its connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def send_message(
         self,
@@ -32,7 +55,7 @@ class EngineClient:
             Engine response with reply, current_node_id, timing, etc.
             None if request fails
         """
-        endpoint = f"{self.base_url}/chat/message-with-flow"
+        endpoint = "/chat/message-with-flow"
 
         payload = {
             "session_id": session_id,
@@ -41,31 +64,33 @@ class EngineClient:
         }
 
         try:
-            logger.info(f"Sending message to engine: session={session_id}, message_len={len(user_message)}")
+            logger.info("Sending message to engine: session=%s, message_len=%s", session_id, len(user_message))
 
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(endpoint, json=payload)
+            response = await self._get_client().post(
+                endpoint,
+                content=json_dumps(payload),
+                headers={"Content-Type": "application/json"},
+            )
 
             if response.status_code == 200:
-                result = response.json()
+                result = json_loads(response.content)
                 logger.info(
-                    f"Engine response received: session={session_id}, "
-                    f"node={result.get('current_node_id')}, "
-                    f"reply_len={len(result.get('reply', ''))}"
+                    "Engine response received: session=%s, node=%s, reply_len=%s",
+                    session_id, result.get('current_node_id'), len(result.get('reply', ''))
                 )
                 return result
             else:
                 logger.error(
-                    f"Engine returned error: status={response.status_code}, "
-                    f"body={response.text[:500]}"
+                    "Engine returned error: status=%s, body=%s",
+                    response.status_code, response.text[:500]
                 )
                 return None
 
         except httpx.TimeoutException:
-            logger.error(f"Engine request timed out after {self.timeout}s: session={session_id}")
+            logger.error("Engine request timed out after %ss: session=%s", self.timeout, session_id)
             return None
         except Exception as e:
-            logger.error(f"Error communicating with engine: {e}", exc_info=True)
+            logger.error("Error communicating with engine: %s", e, exc_info=True)
             return None
 
     async def clear_session(self, session_id: str) -> bool:
@@ -78,33 +103,34 @@ class EngineClient:
         Returns:
             True if successful, False otherwise
         """
-        endpoint = f"{self.base_url}/session/{session_id}"
+        endpoint = f"/session/{session_id}"
 
         try:
-            logger.info(f"Clearing session from engine: session={session_id}")
+            logger.info("Clearing session from engine: session=%s", session_id)
 
-            async with httpx.AsyncClient(timeout=self.clear_timeout) as client:
-                response = await client.delete(endpoint)
+            response = await self._get_client().delete(
+                endpoint, timeout=self.clear_timeout
+            )
 
             if response.status_code == 200:
-                logger.info(f"Session cleared successfully: {session_id}")
+                logger.info("Session cleared successfully: %s", session_id)
                 return True
             elif response.status_code == 404:
                 # Session doesn't exist in engine - that's fine
-                logger.info(f"Session not found in engine (already cleared): {session_id}")
+                logger.info("Session not found in engine (already cleared): %s", session_id)
                 return True
             else:
                 logger.error(
-                    f"Engine returned error clearing session: status={response.status_code}, "
-                    f"body={response.text[:500]}"
+                    "Engine returned error clearing session: status=%s, body=%s",
+                    response.status_code, response.text[:500]
                 )
                 return False
 
         except httpx.TimeoutException:
-            logger.error(f"Engine request timed out clearing session: {session_id}")
+            logger.error("Engine request timed out clearing session: %s", session_id)
             return False
         except Exception as e:
-            logger.error(f"Error clearing session from engine: {e}", exc_info=True)
+            logger.error("Error clearing session from engine: %s", e, exc_info=True)
             return False
 
 
@@ -1,17 +1,155 @@
 """WebSocket client for real-time communication with the EasyPath engine."""
 
 import asyncio
+import hashlib
 import json
 import logging
 import time
-from typing import AsyncGenerator, Dict, Any, Optional
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Deque, Dict, Any, FrozenSet, NamedTuple, Optional, Set
 import websockets
 from websockets.client import WebSocketClientProtocol
 
 from ..database import settings
+# The engine reads text frames, so outgoing payloads are serialized to str
+from ..utils.jsonlib import dumps as _dumps, dumps_sorted as _dumps_sorted, loads as _loads
+
+# Heartbeat reply, serialized once
+_PONG = '{"type":"pong"}'
 
 logger = logging.getLogger(__name__)
 
+# Events after which the engine will not send anything else for the current message
+TERMINAL_EVENTS = frozenset({"session_ended", "error", "message_processing_complete"})
+
+# Events the conversation handlers act on; everything else (node/flow telemetry) is skipped for them
+CONVERSATION_EVENTS = frozenset({"assistant_message", "variable_extracted"}) | TERMINAL_EVENTS
+# Events delivered to listen_for_assistant_messages
+ASSISTANT_LISTENER_EVENTS = frozenset({"assistant_message"}) | TERMINAL_EVENTS
+
+# Frame cap for incoming messages; large flows can exceed the 1 MiB library default
+MAX_FRAME_SIZE = 8 * 1024 * 1024
+
+# Per-listener backlog; a slow consumer loses its oldest events instead of growing without bound
+LISTENER_QUEUE_SIZE = 256
+
+# Maximum number of queued user messages sent in one pass of the send loop
+SEND_BATCH_SIZE = 16
+
+# Number of connection setup locks shared by all sessions (a power of two)
+LOCK_STRIPES = 64
+
+# The reader refreshes a session's last_check timestamp once per this many events
+HEALTH_SAMPLE_FRAMES = 1024
+
+
+class ListenerQueue:
+    """
+    Single-consumer event buffer for one listener.
+
+    A bounded deque plus an asyncio.Event: the reader appends without awaiting and,
+    once full, the oldest event is discarded to make room for the new one.
+    If ``event_types`` is given, the reader only delivers events of those types.
+    """
+
+    __slots__ = ("_events", "_ready", "event_types")
+
+    def __init__(
+        self,
+        maxlen: int = LISTENER_QUEUE_SIZE,
+        event_types: Optional[FrozenSet[str]] = None
+    ):
+        self._events: Deque[Any] = deque(maxlen=maxlen)
+        self._ready = asyncio.Event()
+        self.event_types = event_types
+
+    def put_nowait(self, item: Any) -> bool:
+        """Append an item and wake the consumer. Returns False if the oldest item was dropped."""
+        dropped = len(self._events) == self._events.maxlen
+        self._events.append(item)
+        self._ready.set()
+        return not dropped
+
+    def empty(self) -> bool:
+        """Return True if no events are buffered (like asyncio.Queue.empty)."""
+        return not self._events
+
+    async def get(self) -> Any:
+        """Wait for and return the next item."""
+        while not self._events:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._events.popleft()
+
+
+class SendQueue:
+    """
+    Unbounded single-consumer queue of a session's outgoing user messages.
+
+    A deque plus an asyncio.Event, like ListenerQueue but without a size limit:
+    callers append without awaiting and the send loop takes everything that has
+    accumulated, up to a batch limit, in one wakeup. ``None`` marks shutdown.
+    """
+
+    __slots__ = ("_items", "_ready")
+
+    def __init__(self):
+        self._items: Deque[Any] = deque()
+        self._ready = asyncio.Event()
+
+    def put_nowait(self, item: Any):
+        """Append an item and wake the consumer."""
+        self._items.append(item)
+        self._ready.set()
+
+    async def get_batch(self, limit: int) -> list:
+        """Wait for items and return up to ``limit`` of them, stopping after a ``None``."""
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        items = self._items
+        batch = [items.popleft()]
+        while items and batch[-1] is not None and len(batch) < limit:
+            batch.append(items.popleft())
+        return batch
+
+
+class CachedFlow(NamedTuple):
+    """A flow definition together with its canonical JSON and content hash."""
+
+    flow_data: Dict[str, Any]
+    flow_json: str
+    flow_hash: str
+
+    @classmethod
+    def build(cls, flow_data: Dict[str, Any]) -> "CachedFlow":
+        flow_json = _dumps_sorted(flow_data)
+        flow_hash = hashlib.blake2b(flow_json.encode("utf-8"), digest_size=16).hexdigest()
+        return cls(flow_data, flow_json, flow_hash)
+
+    def user_message_frame(self, user_message: str, include_flow: bool) -> str:
+        """Serialize a user_message frame, splicing in the pre-serialized flow when needed."""
+        frame = '{"type":"user_message","message":' + _dumps(user_message) + ',"flow_hash":"' + self.flow_hash + '"'
+        if include_flow:
+            frame += ',"flow_data":' + self.flow_json
+        return frame + "}"
+
+
+@dataclass
+class SessionState:
+    """Connection, reader task and listeners of one session, looked up together."""
+
+    connection: Optional[WebSocketClientProtocol] = None
+    # Set when the connection is established and cleared by its reader task on exit
+    alive: bool = False
+    # Set while a task holds the session's lock stripe to (re)connect
+    connecting: bool = False
+    # Events received on the current connection
+    frames: int = 0
+    reader_task: Optional[asyncio.Task] = None
+    listeners: Set[ListenerQueue] = field(default_factory=set)
+
 
 class EngineWebSocketClient:
     """Client for receiving real-time events from the engine via WebSocket with connection pooling."""
@@ -26,29 +164,32 @@ class EngineWebSocketClient:
         else:
             self.ws_base_url = base_url
 
-        # Configurable timeouts (can be overridden via environment variables)
-        self.timeout = float(getattr(settings, 'websocket_timeout', 120.0))  # 120 seconds default
+        # Session endpoint prefix, built once instead of on every (re)connect
+        self._session_url_prefix = f"{self.ws_base_url}/ws/session/"
+
+        # Configurable timeouts (can be overridden via environment variables).
+        # Dead peers on an open connection are detected by the websockets keepalive
+        # (ping_interval/ping_timeout), so the reader itself has no deadline.
         self.connection_timeout = float(getattr(settings, 'websocket_connection_timeout', 10.0))
         self.cleanup_delay = float(getattr(settings, 'websocket_cleanup_delay', 5.0))  # Delay before cleanup
 
-        # Connection pool: session_id -> WebSocket connection
-        self._connections: Dict[str, WebSocketClientProtocol] = {}
-
-        # Connection locks for thread-safe access
-        self._connection_locks: Dict[str, asyncio.Lock] = {}
+        # Connection pool: session_id -> connection, reader task and listeners.
+        # Entries are dropped once a session has no connection and no listeners left.
+        self._sessions: Dict[str, SessionState] = {}
 
-        # Connection reader tasks
-        self._reader_tasks: Dict[str, asyncio.Task] = {}
-
-        # Message queues for distributing messages to multiple listeners
-        self._message_queues: Dict[str, list] = {}
+        # Fixed table of locks serializing connection setup; a session maps to
+        # a stripe by hash, so no lock is allocated or freed per session
+        self._lock_stripes = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
 
         # Message sending queue per session for sequential processing
-        self._send_queues: Dict[str, asyncio.Queue] = {}
+        self._send_queues: Dict[str, SendQueue] = {}
         self._send_tasks: Dict[str, asyncio.Task] = {}
 
         # Flow data cache per session
-        self._flow_data_cache: Dict[str, Dict[str, Any]] = {}
+        self._flow_data_cache: Dict[str, CachedFlow] = {}
+
+        # Hash of the flow the engine has cached for the current connection
+        self._session_flow_hash: Dict[str, str] = {}
 
         # Connection health tracking
         self._connection_health: Dict[str, Dict[str, Any]] = {}  # session_id -> {last_ping, last_pong, errors}
@@ -56,37 +197,46 @@ class EngineWebSocketClient:
         # Cleanup tasks for delayed cleanup
         self._cleanup_tasks: Dict[str, asyncio.Task] = {}
 
-    def _get_lock(self, session_id: str) -> asyncio.Lock:
-        """Get or create a lock for the given session."""
-        if session_id not in self._connection_locks:
-            self._connection_locks[session_id] = asyncio.Lock()
-        return self._connection_locks[session_id]
+    def _get_state(self, session_id: str) -> SessionState:
+        """Get or create the state for the given session."""
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = SessionState()
+        return state
 
-    async def _verify_connection_health(self, session_id: str, connection: WebSocketClientProtocol) -> bool:
-        """
-        Verify connection health by checking if it's open and responsive.
-        
-        Returns:
-            True if connection is healthy, False otherwise
-        """
-        try:
-            # Check if connection is open
-            if not connection.open:
-                return False
-            
-            # Try to send a ping to verify responsiveness
-            # Note: websockets library handles ping/pong automatically, but we can check state
-            # For now, just check if connection is open and not in error state
-            return connection.open and not connection.closed
-        except Exception as e:
-            logger.warning(f"Connection health check failed for session={session_id}: {e}")
-            return False
+    def _get_lock(self, session_id: str) -> asyncio.Lock:
+        """Get the lock stripe guarding connection setup for a session."""
+        return self._lock_stripes[hash(session_id) & (LOCK_STRIPES - 1)]
+
+    def _release_state(self, session_id: str, state: SessionState):
+        """Drop a session's state once nothing uses it, so finished sessions do not pile up."""
+        if (
+            state.connection is None
+            and not state.listeners
+            and not state.connecting
+            and self._sessions.get(session_id) is state
+        ):
+            del self._sessions[session_id]
+
+    def register_listener(self, session_id: str, queue: ListenerQueue) -> int:
+        """Register a listener queue for a session and return the listener count."""
+        listeners = self._get_state(session_id).listeners
+        listeners.add(queue)
+        return len(listeners)
+
+    def unregister_listener(self, session_id: str, queue: ListenerQueue) -> int:
+        """Unregister a listener queue and return the number of listeners left."""
+        state = self._sessions.get(session_id)
+        if state is None:
+            return 0
+        state.listeners.discard(queue)
+        self._release_state(session_id, state)
+        return len(state.listeners)
 
     async def _ensure_connection(
         self,
         session_id: str,
         flow_id: Optional[str] = None,
-        retry_count: int = 0,
         max_retries: int = 3
     ) -> WebSocketClientProtocol:
         """
@@ -97,7 +247,6 @@ class EngineWebSocketClient:
         Args:
             session_id: Session ID
             flow_id: Optional flow ID
-            retry_count: Current retry attempt (internal)
             max_retries: Maximum retry attempts
 
         Returns:
@@ -106,161 +255,207 @@ class EngineWebSocketClient:
         Raises:
             Exception: If connection fails after max retries
         """
-        lock = self._get_lock(session_id)
+        # Fast path: reuse an open connection without taking the session lock
+        state = self._get_state(session_id)
+        if state.alive and state.connection is not None:
+            return state.connection
+
+        async with self._get_lock(session_id):
+            # Cleanup may have dropped this state while we waited; make it current again
+            state = self._sessions.setdefault(session_id, state)
+            state.connecting = True
+            try:
+                # Re-check under the lock: another task may have connected meanwhile
+                connection = state.connection
+                if connection is not None:
+                    # An open socket whose reader has exited would never deliver
+                    # events, so it is not reusable either.
+                    if state.alive and connection.open:
+                        logger.debug("Reusing existing WebSocket connection: session=%s", session_id)
+                        return connection
+                    else:
+                        logger.warning("Existing connection is unhealthy, creating new one: session=%s", session_id)
+                        # Clean up unhealthy connection
+                        await self._cleanup_connection(session_id, immediate=True)
+
+                # Create new connection with retry logic; the lock stripe is held
+                # across all attempts so waiters reuse the result
+                ws_url = self._session_url_prefix + session_id
+                if flow_id:
+                    ws_url += f"?flow_id={flow_id}"
+
+                for attempt in range(max_retries + 1):
+                    logger.info("Creating new WebSocket connection: session=%s, url=%s, attempt=%s", session_id, ws_url, attempt + 1)
+
+                    try:
+                        async with asyncio.timeout(self.connection_timeout):
+                            connection = await websockets.connect(
+                                ws_url,
+                                close_timeout=5,
+                                ping_interval=20,
+                                ping_timeout=10,
+                                # flow_data is only sent when the flow changes, so inflating
+                                # every engine event is not worth the CPU
+                                compression=None,
+                                # Let the library buffer bursts of engine events
+                                max_queue=256,
+                                max_size=MAX_FRAME_SIZE
+                            )
+                    except Exception as e:
+                        logger.error("Failed to create WebSocket connection: session=%s, error=%s, attempt=%s", session_id, e, attempt + 1)
+
+                        if attempt == max_retries:
+                            # Update health tracking
+                            if session_id in self._connection_health:
+                                self._connection_health[session_id]["status"] = "failed"
+                                self._connection_health[session_id]["errors"] = self._connection_health[session_id].get("errors", 0) + 1
+                            raise
+
+                        # Retry with exponential backoff
+                        wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
+                        logger.info("Retrying connection in %ss: session=%s", wait_time, session_id)
+                        await asyncio.sleep(wait_time)
+                        continue
 
-        async with lock:
-            # Check if we already have a connection
-            if session_id in self._connections:
-                connection = self._connections[session_id]
+                    state.connection = connection
+                    state.alive = True
+                    state.frames = 0
+                    # A fresh engine socket has no cached flow yet
+                    self._session_flow_hash.pop(session_id, None)
 
-                # Verify connection health
-                if await self._verify_connection_health(session_id, connection):
-                    logger.debug(f"Reusing existing WebSocket connection: session={session_id}")
-                    # Update health tracking
+                    # Initialize health tracking
                     self._connection_health[session_id] = {
                         "last_check": time.time(),
-                        "status": "healthy"
+                        "status": "healthy",
+                        "created_at": time.time(),
+                        "errors": 0
                     }
-                    return connection
-                else:
-                    logger.warning(f"Existing connection is unhealthy, creating new one: session={session_id}")
-                    # Clean up unhealthy connection
-                    await self._cleanup_connection(session_id, immediate=True)
 
-            # Create new connection with retry logic
-            ws_url = f"{self.ws_base_url}/ws/session/{session_id}"
-            if flow_id:
-                ws_url += f"?flow_id={flow_id}"
+                    logger.info("WebSocket connection established: session=%s", session_id)
 
-            logger.info(f"Creating new WebSocket connection: session={session_id}, url={ws_url}, attempt={retry_count + 1}")
-
-            try:
-                connection = await asyncio.wait_for(
-                    websockets.connect(
-                        ws_url,
-                        close_timeout=5,
-                        ping_interval=20,
-                        ping_timeout=10
-                    ),
-                    timeout=self.connection_timeout
-                )
-
-                self._connections[session_id] = connection
-                
-                # Initialize health tracking
-                self._connection_health[session_id] = {
-                    "last_check": time.time(),
-                    "status": "healthy",
-                    "created_at": time.time(),
-                    "errors": 0
-                }
-                
-                logger.info(f"WebSocket connection established: session={session_id}")
-
-                # Start reader task for this connection
-                reader_task = asyncio.create_task(
-                    self._read_connection(session_id, connection)
-                )
-                self._reader_tasks[session_id] = reader_task
-
-                # Start message sender task if not already started
-                if session_id not in self._send_tasks or self._send_tasks[session_id].done():
-                    self._send_tasks[session_id] = asyncio.create_task(
-                        self._process_send_queue(session_id)
+                    # Start reader task for this connection
+                    state.reader_task = asyncio.create_task(
+                        self._read_connection(session_id, connection)
                     )
 
-                return connection
-
-            except Exception as e:
-                logger.error(f"Failed to create WebSocket connection: session={session_id}, error={e}, attempt={retry_count + 1}")
-                
-                # Retry with exponential backoff
-                if retry_count < max_retries:
-                    wait_time = 2 ** retry_count  # Exponential backoff: 1s, 2s, 4s
-                    logger.info(f"Retrying connection in {wait_time}s: session={session_id}")
-                    await asyncio.sleep(wait_time)
-                    return await self._ensure_connection(session_id, flow_id, retry_count + 1, max_retries)
-                else:
-                    # Update health tracking
-                    if session_id in self._connection_health:
-                        self._connection_health[session_id]["status"] = "failed"
-                        self._connection_health[session_id]["errors"] = self._connection_health[session_id].get("errors", 0) + 1
-                    raise
+                    return connection
+            finally:
+                state.connecting = False
+                # Drop the state if the attempt failed and nobody else uses it
+                self._release_state(session_id, state)
+
+    def _ensure_send_task(self, session_id: str) -> SendQueue:
+        """Get the session's send queue, starting its sender task if it is not running."""
+        queue = self._send_queues.get(session_id)
+        if queue is None:
+            queue = self._send_queues[session_id] = SendQueue()
+
+        task = self._send_tasks.get(session_id)
+        if task is None or task.done():
+            self._send_tasks[session_id] = asyncio.create_task(
+                self._process_send_queue(session_id, queue)
+            )
+        return queue
 
-    async def _process_send_queue(self, session_id: str):
+    async def _process_send_queue(self, session_id: str, queue: SendQueue):
         """
         Process messages from the send queue sequentially for a session.
         Ensures messages are sent in order and handles errors gracefully.
         """
-        if session_id not in self._send_queues:
-            self._send_queues[session_id] = asyncio.Queue()
-
-        queue = self._send_queues[session_id]
-
         while True:
             try:
-                # Get message from queue (blocks until available)
-                message_data = await queue.get()
+                # Get messages from queue (blocks until available); whatever
+                # has accumulated meanwhile goes out together
+                batch = await queue.get_batch(SEND_BATCH_SIZE)
 
-                # Check for sentinel value (shutdown)
-                if message_data is None:
-                    logger.debug(f"Send queue shutdown signal received: session={session_id}")
-                    break
+                # Check for sentinel value (shutdown); the batch stops at it
+                shutdown = batch[-1] is None
+                if shutdown:
+                    batch.pop()
 
-                user_message, flow_data, flow_id, future = message_data
+                if batch:
+                    await self._send_batch(session_id, batch)
 
-                try:
-                    # Ensure connection exists
-                    connection = await self._ensure_connection(session_id, flow_id)
-
-                    # Cache flow_data if changed
-                    if session_id not in self._flow_data_cache or self._flow_data_cache[session_id] != flow_data:
-                        self._flow_data_cache[session_id] = flow_data
-                        logger.debug(f"Cached flow_data for session={session_id}")
-
-                    # Build message (only send flow_data if it changed)
-                    message = {
-                        "type": "user_message",
-                        "message": user_message,
-                    }
-                    
-                    # Only include flow_data if it's not cached or if it changed
-                    # For now, always send it to ensure compatibility, but mark it
-                    if session_id in self._flow_data_cache:
-                        # Could optimize by sending hash and checking server-side cache
-                        message["flow_data"] = flow_data
+                if shutdown:
+                    logger.debug("Send queue shutdown signal received: session=%s", session_id)
+                    break
 
-                    # Send message
-                    await connection.send(json.dumps(message))
+            except asyncio.CancelledError:
+                logger.debug("Send queue task cancelled: session=%s", session_id)
+                break
+            except Exception as e:
+                logger.error("Error in send queue processor: session=%s, error=%s", session_id, e, exc_info=True)
+                await asyncio.sleep(1)  # Brief pause before retrying
 
+    async def _send_batch(self, session_id: str, batch: list):
+        """
+        Send a batch of queued user messages back to back on one connection.
+        Each message still gets its own frame; the futures are resolved once
+        the whole batch has been written.
+        """
+        sent = 0
+        try:
+            for user_message, flow_data, flow_id, _ in batch:
+                # Ensure connection exists (a no-op after the first message)
+                connection = await self._ensure_connection(session_id, flow_id)
+
+                # Cache the serialized flow (also used to resend on a flow miss);
+                # it is only re-serialized when a different flow object comes in
+                cached = self._flow_data_cache.get(session_id)
+                if cached is None or cached.flow_data is not flow_data:
+                    cached = self._flow_data_cache[session_id] = CachedFlow.build(flow_data)
+                flow_hash = cached.flow_hash
+
+                # The engine keeps the flow per connection, so flow_data is
+                # only sent when the hash changed
+                include_flow = self._session_flow_hash.get(session_id) != flow_hash
+                if include_flow:
+                    logger.debug("Sending full flow_data: session=%s, flow_hash=%s", session_id, flow_hash)
+
+                # Send message
+                await connection.send(cached.user_message_frame(user_message, include_flow))
+                self._session_flow_hash[session_id] = flow_hash
+                sent += 1
+
+                if logger.isEnabledFor(logging.INFO):
                     logger.info(
-                        f"📤 Sent user message via WebSocket: session={session_id}, "
-                        f'message="{user_message[:100]}"'
+                        '📤 Sent user message via WebSocket: session=%s, message="%s"',
+                        session_id, user_message[:100]
                     )
 
-                    # Mark task as done and set result
-                    if future and not future.done():
-                        future.set_result(True)
+        except Exception as e:
+            logger.error(
+                "Failed to send user message via WebSocket: session=%s, error=%s",
+                session_id, e,
+                exc_info=True
+            )
+            # Fail the message that raised and everything queued behind it
+            for *_, future in batch[sent:]:
+                if future and not future.done():
+                    future.set_exception(e)
 
-                except Exception as e:
-                    logger.error(
-                        f"Failed to send user message via WebSocket: session={session_id}, error={e}",
-                        exc_info=True
-                    )
-                    # Set exception on future if provided
-                    if future and not future.done():
-                        future.set_exception(e)
-                    # Don't break - continue processing queue
+        # Mark the messages that went out as sent
+        for *_, future in batch[:sent]:
+            if future and not future.done():
+                future.set_result(True)
 
-                finally:
-                    queue.task_done()
+    async def _resend_with_flow(
+        self,
+        session_id: str,
+        websocket: WebSocketClientProtocol,
+        event: Dict[str, Any]
+    ):
+        """Resend a user message together with its flow_data after a flow_miss event."""
+        self._session_flow_hash.pop(session_id, None)
 
-            except asyncio.CancelledError:
-                logger.debug(f"Send queue task cancelled: session={session_id}")
-                break
-            except Exception as e:
-                logger.error(f"Error in send queue processor: session={session_id}, error={e}", exc_info=True)
-                await asyncio.sleep(1)  # Brief pause before retrying
+        cached = self._flow_data_cache.get(session_id)
+        if cached is None:
+            logger.error("Engine reported flow_miss but no flow_data is cached: session=%s", session_id)
+            return
+
+        logger.info("Engine reported flow_miss, resending flow_data: session=%s", session_id)
+        await websocket.send(cached.user_message_frame(event.get("message", ""), include_flow=True))
+        self._session_flow_hash[session_id] = cached.flow_hash
 
     async def send_user_message(
         self,
@@ -285,28 +480,22 @@ class EngineWebSocketClient:
         Raises:
             Exception: If connection fails or message send fails
         """
-        # Ensure send queue exists
-        if session_id not in self._send_queues:
-            self._send_queues[session_id] = asyncio.Queue()
-
-        # Ensure sender task is running
-        if session_id not in self._send_tasks or self._send_tasks[session_id].done():
-            self._send_tasks[session_id] = asyncio.create_task(
-                self._process_send_queue(session_id)
-            )
+        # Ensure send queue exists and its sender task is running
+        queue = self._ensure_send_task(session_id)
 
         # Create future to wait for message to be sent
         future = asyncio.Future()
 
         # Add message to queue
-        await self._send_queues[session_id].put((user_message, flow_data, flow_id, future))
+        queue.put_nowait((user_message, flow_data, flow_id, future))
 
         # Wait for message to be sent (or error)
         try:
             await future
         except Exception as e:
             logger.error(
-                f"Error waiting for message send: session={session_id}, error={e}",
+                "Error waiting for message send: session=%s, error=%s",
+                session_id, e,
                 exc_info=True
             )
             raise
@@ -320,89 +509,105 @@ class EngineWebSocketClient:
         Background task that reads from WebSocket and distributes messages to queues.
         Handles ping/pong messages and connection health monitoring.
         """
+        state = self._get_state(session_id)
+
         try:
-            async with asyncio.timeout(self.timeout):
-                async for message in websocket:
+            async for message in websocket:
+                try:
+                    # Engine frames are JSON; the plain text ping is only
+                    # checked for once parsing has failed
                     try:
-                        # Handle ping messages from server
-                        if isinstance(message, str) and message.strip() == "ping":
-                            logger.debug(f"Received plain text ping, responding: session={session_id}")
+                        event = _loads(message)
+                    except json.JSONDecodeError:
+                        if message.strip() in ("ping", b"ping"):
+                            logger.debug("Received plain text ping, responding: session=%s", session_id)
                             await websocket.send("pong")
                             continue
+                        raise
+
+                    # Handle JSON ping messages
+                    message_type = event.get("type")
+                    if message_type == "ping":
+                        logger.debug("Received JSON ping, responding: session=%s", session_id)
+                        await websocket.send(_PONG)
+                        # Update health tracking
+                        if session_id in self._connection_health:
+                            self._connection_health[session_id]["last_ping"] = time.time()
+                        continue
 
-                        event = json.loads(message)
-                        
-                        # Handle JSON ping messages
-                        message_type = event.get("type")
-                        if message_type == "ping":
-                            logger.debug(f"Received JSON ping, responding: session={session_id}")
-                            await websocket.send(json.dumps({"type": "pong"}))
-                            # Update health tracking
-                            if session_id in self._connection_health:
-                                self._connection_health[session_id]["last_ping"] = time.time()
-                            continue
+                    event_type = event.get("event_type")
 
-                        event_type = event.get("event_type")
+                    # Engine lost its cached flow: resend the message with the full flow
+                    if event_type == "flow_miss":
+                        await self._resend_with_flow(session_id, websocket, event)
+                        continue
 
+                    if logger.isEnabledFor(logging.DEBUG):
                         logger.debug(
-                            f"Received WebSocket event: type={event_type}, "
-                            f"session={session_id}"
+                            "Received WebSocket event: type=%s, session=%s",
+                            event_type, session_id
                         )
 
-                        # Update health tracking on successful message
-                        if session_id in self._connection_health:
-                            self._connection_health[session_id]["last_check"] = time.time()
-                            self._connection_health[session_id]["status"] = "healthy"
-
-                        # Distribute event to all listening queues
-                        if session_id in self._message_queues:
-                            num_queues = len(self._message_queues[session_id])
-                            logger.debug(f"📨 Distributing event={event_type} to {num_queues} queues: session={session_id}")
-                            for queue in self._message_queues[session_id]:
-                                try:
-                                    await queue.put(event)
-                                except Exception as e:
-                                    logger.error(f"Error putting event into queue: {e}")
-
-                        # Break on session end or error events
-                        if event_type in ("session_ended", "error", "message_processing_complete"):
-                            logger.info(
-                                f"WebSocket session ending: type={event_type}, "
-                                f"session={session_id}"
-                            )
-                            break
+                    # Count the event; the wall-clock health timestamp is only
+                    # refreshed every HEALTH_SAMPLE_FRAMES events
+                    state.frames += 1
+                    if not state.frames % HEALTH_SAMPLE_FRAMES:
+                        health = self._connection_health.get(session_id)
+                        if health is not None:
+                            health["last_check"] = time.time()
+
+                    # Distribute event to all listening queues without blocking the reader
+                    queues = state.listeners
+                    if queues:
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("📨 Distributing event=%s to %s queues: session=%s", event_type, len(queues), session_id)
+                        for queue in tuple(queues):
+                            if queue.event_types is not None and event_type not in queue.event_types:
+                                continue
+                            if not queue.put_nowait(event):
+                                logger.warning(
+                                    "Listener queue full, dropped oldest event: session=%s",
+                                    session_id
+                                )
+
+                    # Break on session end or error events
+                    if event_type in TERMINAL_EVENTS:
+                        logger.info(
+                            "WebSocket session ending: type=%s, session=%s",
+                            event_type, session_id
+                        )
+                        break
 
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to parse WebSocket message: {e}, message={message[:100]}")
-                        continue
-                    except Exception as e:
-                        logger.error(f"Error processing WebSocket event: {e}", exc_info=True)
-                        # Update error count in health tracking
-                        if session_id in self._connection_health:
-                            self._connection_health[session_id]["errors"] = \
-                                self._connection_health[session_id].get("errors", 0) + 1
-                        continue
+                except json.JSONDecodeError as e:
+                    logger.error("Failed to parse WebSocket message: %s, message=%s", e, message[:100])
+                    continue
+                except Exception as e:
+                    logger.error("Error processing WebSocket event: %s", e, exc_info=True)
+                    # Update error count in health tracking
+                    if session_id in self._connection_health:
+                        self._connection_health[session_id]["errors"] = \
+                            self._connection_health[session_id].get("errors", 0) + 1
+                    continue
 
-            logger.info(f"WebSocket reader completed: session={session_id}")
+            logger.info("WebSocket reader completed: session=%s", session_id)
 
-        except asyncio.TimeoutError:
-            logger.warning(
-                f"WebSocket connection timed out after {self.timeout}s: "
-                f"session={session_id}"
-            )
-            if session_id in self._connection_health:
-                self._connection_health[session_id]["status"] = "timeout"
         except websockets.exceptions.WebSocketException as e:
-            logger.error(f"WebSocket error: {e}", exc_info=True)
+            logger.error("WebSocket error: %s", e, exc_info=True)
             if session_id in self._connection_health:
                 self._connection_health[session_id]["status"] = "error"
                 self._connection_health[session_id]["errors"] = \
                     self._connection_health[session_id].get("errors", 0) + 1
         except Exception as e:
-            logger.error(f"Unexpected error in WebSocket reader: {e}", exc_info=True)
+            logger.error("Unexpected error in WebSocket reader: %s", e, exc_info=True)
             if session_id in self._connection_health:
                 self._connection_health[session_id]["status"] = "error"
         finally:
+            if state.connection is websocket:
+                state.alive = False
+                # No more events will arrive on this connection; wake the listeners
+                # now, since the delayed cleanup skips sessions that still have some
+                for queue in tuple(state.listeners):
+                    queue.put_nowait(None)
             # Clean up connection
             await self._cleanup_connection(session_id, immediate=False)
 
@@ -433,85 +638,81 @@ class EngineWebSocketClient:
                 try:
                     await asyncio.sleep(self.cleanup_delay)
                     # Check if connection is still unused before cleaning up
-                    if session_id in self._message_queues:
-                        if len(self._message_queues[session_id]) == 0:
-                            await self._do_cleanup(session_id)
-                        else:
-                            logger.debug(f"Skipping cleanup, listeners still active: session={session_id}")
+                    state = self._sessions.get(session_id)
+                    if state is not None and state.listeners:
+                        logger.debug("Skipping cleanup, listeners still active: session=%s", session_id)
                     else:
                         await self._do_cleanup(session_id)
                 except asyncio.CancelledError:
-                    logger.debug(f"Delayed cleanup cancelled: session={session_id}")
+                    logger.debug("Delayed cleanup cancelled: session=%s", session_id)
 
             self._cleanup_tasks[session_id] = asyncio.create_task(delayed_cleanup())
 
     async def _do_cleanup(self, session_id: str):
         """Perform actual cleanup of connection and resources."""
-        logger.debug(f"Cleaning up WebSocket connection: session={session_id}")
-
-        # Stop send queue processor
-        if session_id in self._send_tasks:
-            task = self._send_tasks[session_id]
-            if not task.done():
+        logger.debug("Cleaning up WebSocket connection: session=%s", session_id)
+
+        # Stop the send queue processor, the reader task and the connection together
+        # instead of waiting for each cancellation in turn. The caller may itself be
+        # the send task (reconnecting from _ensure_connection), which must not await
+        # its own cancellation.
+        current = asyncio.current_task()
+        pending = []
+
+        send_task = self._send_tasks.get(session_id)
+        if send_task is not current:
+            if send_task is not None and not send_task.done():
                 # Signal shutdown
-                if session_id in self._send_queues:
-                    await self._send_queues[session_id].put(None)
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-            del self._send_tasks[session_id]
-
-        # Clean up send queue
-        if session_id in self._send_queues:
-            del self._send_queues[session_id]
-
-        # Close WebSocket
-        if session_id in self._connections:
-            connection = self._connections[session_id]
-            try:
-                if connection.open:
-                    await connection.close()
-            except Exception as e:
-                logger.warning(f"Error closing WebSocket: session={session_id}, error={e}")
-            finally:
-                del self._connections[session_id]
-
-        # Cancel reader task
-        if session_id in self._reader_tasks:
-            task = self._reader_tasks[session_id]
-            if not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-            del self._reader_tasks[session_id]
-
-        # Clean up message queues
-        if session_id in self._message_queues:
+                queue = self._send_queues.get(session_id)
+                if queue is not None:
+                    queue.put_nowait(None)
+                send_task.cancel()
+                pending.append(send_task)
+            self._send_tasks.pop(session_id, None)
+
+            # Clean up send queue
+            self._send_queues.pop(session_id, None)
+
+        state = self._sessions.get(session_id)
+        closing = None
+        if state is not None:
+            connection, state.connection = state.connection, None
+            state.alive = False
+
+            # Cancel reader task
+            reader_task, state.reader_task = state.reader_task, None
+            if reader_task is not None and not reader_task.done() and reader_task is not current:
+                reader_task.cancel()
+                pending.append(reader_task)
+
+            # Close WebSocket
+            if connection is not None and connection.open:
+                closing = connection.close()
+                pending.append(closing)
+
+        if pending:
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            if closing is not None and isinstance(results[-1], Exception):
+                logger.warning("Error closing WebSocket: session=%s, error=%s", session_id, results[-1])
+
+        if state is not None:
             # Signal all queues that connection is closed
-            for queue in self._message_queues[session_id]:
-                try:
-                    await queue.put(None)  # Sentinel value
-                except Exception as e:
-                    logger.warning(f"Error signaling queue closure: {e}")
-            del self._message_queues[session_id]
+            for queue in state.listeners:
+                queue.put_nowait(None)  # Sentinel value
+            state.listeners.clear()
+
+            self._release_state(session_id, state)
 
         # Clean up flow data cache
         if session_id in self._flow_data_cache:
             del self._flow_data_cache[session_id]
+        self._session_flow_hash.pop(session_id, None)
 
         # Clean up health tracking
         if session_id in self._connection_health:
             del self._connection_health[session_id]
 
-        # Clean up lock
-        if session_id in self._connection_locks:
-            del self._connection_locks[session_id]
-
-        logger.debug(f"WebSocket cleanup complete: session={session_id}")
+        logger.debug("WebSocket cleanup complete: session=%s", session_id)
 
     async def listen_for_assistant_messages(
         self,
@@ -534,17 +735,16 @@ class EngineWebSocketClient:
         Raises:
             Exception: If connection fails or times out
         """
-        # Create queue for this listener
-        queue = asyncio.Queue()
+        # Create queue for this listener: assistant messages are yielded, terminal
+        # events end the listener (nothing else bounds the wait)
+        queue = ListenerQueue(event_types=ASSISTANT_LISTENER_EVENTS)
 
         # Register queue for message distribution
-        if session_id not in self._message_queues:
-            self._message_queues[session_id] = []
-        self._message_queues[session_id].append(queue)
+        total_listeners = self.register_listener(session_id, queue)
 
         logger.info(
-            f"🔔 REGISTERED listener for session={session_id}, "
-            f"total_listeners={len(self._message_queues[session_id])}"
+            "🔔 REGISTERED listener for session=%s, total_listeners=%s",
+            session_id, total_listeners
         )
 
         try:
@@ -557,47 +757,53 @@ class EngineWebSocketClient:
 
                 # Check for sentinel value (connection closed)
                 if event is None:
-                    logger.debug(f"Connection closed, stopping listener: session={session_id}")
+                    logger.debug("Connection closed, stopping listener: session=%s", session_id)
                     break
 
                 event_type = event.get("event_type")
+                if event_type in TERMINAL_EVENTS:
+                    logger.debug(
+                        "Session turn ended, stopping listener: type=%s, session=%s",
+                        event_type, session_id
+                    )
+                    break
 
-                if event_type == "assistant_message":
-                    message = event.get("message", "")
-                    node_id = event.get("node_id")
+                message = event.get("message")
 
-                    if message.strip():  # Only yield non-empty messages
-                        logger.info(
-                            f"Yielding assistant message: session={session_id}, "
-                            f"node={node_id}, message_len={len(message)}"
-                        )
-                        yield message
-                    else:
-                        logger.warning(
-                            f"Skipping empty assistant message: session={session_id}, "
-                            f"node={node_id}"
-                        )
+                # Only yield non-empty messages (isspace avoids building a stripped copy)
+                if not message or message.isspace():
+                    logger.warning(
+                        "Skipping empty assistant message: session=%s, node=%s",
+                        session_id, event.get("node_id")
+                    )
+                    continue
+
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        "Yielding assistant message: session=%s, node=%s, message_len=%s",
+                        session_id, event.get("node_id"), len(message)
+                    )
+                yield message
 
         except Exception as e:
             logger.error(
-                f"Error listening for assistant messages: session={session_id}, error={e}",
+                "Error listening for assistant messages: session=%s, error=%s",
+                session_id, e,
                 exc_info=True
             )
             raise
         finally:
             # Unregister queue
-            if session_id in self._message_queues:
-                if queue in self._message_queues[session_id]:
-                    self._message_queues[session_id].remove(queue)
-                    logger.info(
-                        f"🔕 UNREGISTERED listener for session={session_id}, "
-                        f"remaining_listeners={len(self._message_queues[session_id])}"
-                    )
+            remaining_listeners = self.unregister_listener(session_id, queue)
+            logger.info(
+                "🔕 UNREGISTERED listener for session=%s, remaining_listeners=%s",
+                session_id, remaining_listeners
+            )
 
-                # If no more listeners, schedule delayed cleanup (not immediate)
-                if not self._message_queues[session_id]:
-                    logger.info(f"No more listeners, scheduling cleanup: session={session_id}")
-                    await self._cleanup_connection(session_id, immediate=False)
+            # If no more listeners, schedule delayed cleanup (not immediate)
+            if not remaining_listeners:
+                logger.info("No more listeners, scheduling cleanup: session=%s", session_id)
+                await self._cleanup_connection(session_id, immediate=False)
 
     async def close_connection(self, session_id: str):
         """
@@ -606,7 +812,7 @@ class EngineWebSocketClient:
         Args:
             session_id: Session ID to close connection for
         """
-        logger.info(f"Explicitly closing WebSocket connection: session={session_id}")
+        logger.info("Explicitly closing WebSocket connection: session=%s", session_id)
         await self._cleanup_connection(session_id, immediate=True)
 
     def get_connection_health(self, session_id: str) -> Optional[Dict[str, Any]]:
@@ -619,7 +825,11 @@ class EngineWebSocketClient:
         Returns:
             Health metrics dict or None if session not found
         """
-        return self._connection_health.get(session_id)
+        health = self._connection_health.get(session_id)
+        if health is None:
+            return None
+        state = self._sessions.get(session_id)
+        return {**health, "frames": state.frames if state is not None else 0}
 
     def get_all_connection_health(self) -> Dict[str, Dict[str, Any]]:
         """
@@ -628,7 +838,10 @@ class EngineWebSocketClient:
         Returns:
             Dict mapping session_id to health metrics
         """
-        return self._connection_health.copy()
+        return {
+            session_id: self.get_connection_health(session_id)
+            for session_id in self._connection_health
+        }
 
 
 # Singleton instance
@@ -1,32 +1,134 @@
 import asyncio
 import hashlib
 import logging
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict
-from uuid import uuid4
+from typing import Any, Dict, Iterator, Optional
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from telegram import Bot, Update
+from telegram import Bot
 from telegram.constants import ChatAction
+from telegram.ext import AIORateLimiter, ExtBot
+from telegram.request import HTTPXRequest
 
 from ..models import BotConfig, ConversationMessage, PlatformConversation
 from easypath_shared.constants import ConversationMessageRoles, MessagingPlatform
 from ..database import settings
 from .engine_client import engine_client
-from .engine_ws_client import engine_ws_client
-from .variable_storage import persist_variable
+from .engine_ws_client import CONVERSATION_EVENTS, TERMINAL_EVENTS, ListenerQueue, engine_ws_client
+from .variable_storage import persist_variables
 
 logger = logging.getLogger(__name__)
 
+# How long to wait for further streamed messages before showing typing again
+BURST_WINDOW = 0.5
+
+# Maximum length of a single Telegram message
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Most recently sent messages remembered for deduplication per streaming call
+DEDUP_MAX_ENTRIES = 32
+
+# How long, and for how many updates, webhook update ids are remembered
+# so that Telegram redeliveries are not processed twice
+UPDATE_DEDUP_TTL = 3600.0
+UPDATE_DEDUP_MAX_ENTRIES = 10000
+
+# Keep-alive connections to the Bot API, shared by all bots (the library
+# default is 1 per bot, which makes concurrent sends queue up for the pool)
+TELEGRAM_CONNECTION_POOL_SIZE = 256
+
+# Times a request rejected with 429 (RetryAfter) is retried after the
+# requested delay; the rate limiter paces sends so this should be rare
+BOT_RATE_LIMIT_RETRIES = 2
+
+# Most recently used bots kept per process
+BOT_CACHE_MAX_ENTRIES = 256
+
+
+def _iter_chunks(text: str, size: int) -> Iterator[str]:
+    """
+    Yield pieces of text of at most size characters.
+
+    A piece ends at the last line break in its second half when there is one,
+    so long messages are not cut mid-line; the line break itself is dropped.
+    """
+    start = 0
+    length = len(text)
+    while length - start > size:
+        end = start + size
+        newline = text.rfind("\n", start + size // 2, end)
+        if newline == -1:
+            yield text[start:end]
+            start = end
+        else:
+            yield text[start:newline]
+            start = newline + 1
+    if start < length:
+        yield text[start:]
+
+
+@dataclass(frozen=True)
+class TelegramTextMessage:
+    """The fields of a Telegram text message update that the gateway uses"""
+
+    update_id: Optional[int]
+    message_id: int
+    chat_id: int
+    text: str
+    date: int  # Unix seconds, as sent by Telegram
+    user_id: Optional[int]
+    username: Optional[str]
+
+    @classmethod
+    def from_update(cls, update_data: Dict[str, Any]) -> Optional["TelegramTextMessage"]:
+        """
+        Read a raw webhook update without building the python-telegram-bot objects.
+
+        Returns:
+            The message, or None if the update is not a text message
+        """
+        message = update_data.get("message")
+        if not message or not message.get("text"):
+            return None
+
+        sender = message.get("from") or {}
+        return cls(
+            update_id=update_data.get("update_id"),
+            message_id=message["message_id"],
+            chat_id=message["chat"]["id"],
+            text=message["text"],
+            date=message["date"],
+            user_id=sender.get("id"),
+            username=sender.get("username") or sender.get("first_name"),
+        )
+
 
 class TelegramService:
     """Handles Telegram bot interactions and message forwarding"""
 
     def __init__(self):
-        self.bots: Dict[int, Bot] = {}  # bot_config_id -> Bot instance
+        # One connection pool to api.telegram.org for every bot; the token is
+        # part of each request URL, so bots can share the transport
+        self._request = HTTPXRequest(
+            connection_pool_size=TELEGRAM_CONNECTION_POOL_SIZE,
+            pool_timeout=10.0,
+            connect_timeout=5.0,
+            read_timeout=30.0,
+        )
+        # bot_config_id -> Bot instance, least recently used first
+        self.bots: "OrderedDict[int, Bot]" = OrderedDict()
+        # (bot_config_id, update_id) -> time first seen, oldest first
+        self._seen_updates: "OrderedDict[tuple, float]" = OrderedDict()
         # Record container startup time to ignore old messages
         self.startup_time = datetime.now(timezone.utc)
-        logger.info(f"TelegramService initialized at {self.startup_time.isoformat()}")
+        # Same instant in Telegram's unit (Unix seconds) for the stale check
+        self._startup_unix = int(self.startup_time.timestamp())
+        logger.info("TelegramService initialized at %s", self.startup_time.isoformat())
 
     def get_bot(self, bot_config: BotConfig) -> Bot:
         """Get or create a Telegram Bot instance for a bot config"""
@@ -34,9 +136,65 @@ class TelegramService:
         if bot_config.platform != MessagingPlatform.TELEGRAM:
             raise ValueError(f"Invalid platform for Telegram bot: {bot_config.platform}")
 
-        if bot_config.id not in self.bots:
-            self.bots[bot_config.id] = Bot(token=bot_config.bot_token)
-        return self.bots[bot_config.id]
+        bot = self.bots.get(bot_config.id)
+        if bot is not None:
+            self.bots.move_to_end(bot_config.id)
+            return bot
+
+        # ExtBot paces requests below Telegram's flood limits (30/s per bot,
+        # 20/min per group) instead of running into 429s
+        bot = ExtBot(
+            token=bot_config.bot_token,
+            request=self._request,
+            rate_limiter=AIORateLimiter(max_retries=BOT_RATE_LIMIT_RETRIES),
+        )
+        self.bots[bot_config.id] = bot
+        # Evicted bots own no connections, dropping them is enough
+        while len(self.bots) > BOT_CACHE_MAX_ENTRIES:
+            self.bots.popitem(last=False)
+        return bot
+
+    async def shutdown(self):
+        """Close the Bot API connection pool shared by all bots"""
+        self.bots.clear()
+        try:
+            await self._request.shutdown()
+        except Exception as e:
+            logger.warning("Error closing Telegram HTTP client: %s", e)
+
+    def is_stale(self, update: TelegramTextMessage) -> bool:
+        """Check whether a message was sent before this container started"""
+        if update.date >= self._startup_unix:
+            return False
+        logger.info(
+            "Ignoring old message from before container startup: message_date=%s, startup_time=%s, age=%ss, update_id=%s",
+            update.date, self._startup_unix, self._startup_unix - update.date, update.update_id
+        )
+        return True
+
+    def claim_update(self, bot_config_id: int, update_id: Optional[int]) -> bool:
+        """
+        Record a webhook update as being processed.
+
+        Returns:
+            False if the same update was already received recently (a redelivery)
+        """
+        if update_id is None:
+            return True
+
+        now = time.monotonic()
+        seen = self._seen_updates
+        while seen:
+            oldest_key, seen_at = next(iter(seen.items()))
+            if now - seen_at < UPDATE_DEDUP_TTL and len(seen) < UPDATE_DEDUP_MAX_ENTRIES:
+                break
+            del seen[oldest_key]
+
+        key = (bot_config_id, update_id)
+        if key in seen:
+            return False
+        seen[key] = now
+        return True
 
     async def set_webhook(self, bot_config: BotConfig, webhook_url: str) -> bool:
         """Configure webhook for a Telegram bot"""
@@ -46,22 +204,24 @@ class TelegramService:
 
             if success:
                 logger.info(
-                    f"Webhook set successfully for bot {bot_config.id}: {webhook_url}"
+                    "Webhook set successfully for bot %s: %s",
+                    bot_config.id, webhook_url
                 )
                 return True
             else:
-                logger.error(f"Failed to set webhook for bot {bot_config.id}")
+                logger.error("Failed to set webhook for bot %s", bot_config.id)
                 return False
 
         except Exception as e:
             logger.error(
-                f"Error setting webhook for bot {bot_config.id}: {e}", exc_info=True
+                "Error setting webhook for bot %s: %s",
+                bot_config.id, e, exc_info=True
             )
             return False
 
     async def process_update(
         self,
-        update: Update,
+        update: TelegramTextMessage,
         bot_config: BotConfig,
         flow_data: Dict[str, Any],
         db: Session,
@@ -70,7 +230,7 @@ class TelegramService:
         Process a Telegram webhook update.
 
         Args:
-            update: Telegram update
+            update: Text message read from the Telegram update
             bot_config: Bot configuration from database
             flow_data: Flow definition to execute
             db: Database session
@@ -79,47 +239,29 @@ class TelegramService:
             True if processed successfully, False otherwise
         """
         try:
-            if not update.message or not update.message.text:
-                logger.warning(
-                    f"Received update without text message: {update.update_id}"
-                )
-                return True  # Not an error, just ignore
-
             # Check if message is older than container startup (ignore stale messages)
-            message_date = update.message.date
-            if message_date < self.startup_time:
-                age_seconds = (self.startup_time - message_date).total_seconds()
-                logger.info(
-                    f"Ignoring old message from before container startup: "
-                    f"message_date={message_date.isoformat()}, "
-                    f"startup_time={self.startup_time.isoformat()}, "
-                    f"age={age_seconds:.0f}s, "
-                    f"update_id={update.update_id}"
-                )
+            if self.is_stale(update):
                 return True  # Acknowledge but don't process
 
-            user_message = update.message.text
+            user_message = update.text
             
-            if not update.message.from_user or not update.message.from_user.id:
-                logger.warning(f"Received update without from user: {update.update_id}")
+            if not update.user_id:
+                logger.warning("Received update without from user: %s", update.update_id)
                 return False
 
-            telegram_user_id = str(update.message.from_user.id)
-            telegram_username = (
-                update.message.from_user.username or update.message.from_user.first_name
-            )
-            chat_id = update.message.chat_id
+            telegram_user_id = str(update.user_id)
+            telegram_username = update.username
+            chat_id = update.chat_id
 
             logger.info(
-                f"Processing Telegram message: bot={bot_config.id}, "
-                f"user={telegram_user_id} (@{telegram_username}), "
-                f'message="{user_message[:100]}"'
+                'Processing Telegram message: bot=%s, user=%s (@%s), message="%.100s"',
+                bot_config.id, telegram_user_id, telegram_username, user_message
             )
 
             # Get or create conversation
             logger.debug(
-                f"Looking up conversation: bot_config_id={bot_config.id}, "
-                f"platform_user_id={telegram_user_id}"
+                "Looking up conversation: bot_config_id=%s, platform_user_id=%s",
+                bot_config.id, telegram_user_id
             )
 
             conversation = (
@@ -133,19 +275,20 @@ class TelegramService:
 
             if conversation:
                 logger.debug(
-                    f"Found existing conversation: id={conversation.id}, "
-                    f"session={conversation.session_id}, status={conversation.status}"
+                    "Found existing conversation: id=%s, session=%s, status=%s",
+                    conversation.id, conversation.session_id, conversation.status
                 )
             else:
                 logger.debug(
-                    f"No existing conversation found for user {telegram_user_id}"
+                    "No existing conversation found for user %s",
+                    telegram_user_id
                 )
 
             # Check if conversation is closed
             if conversation and conversation.status == "closed":
                 logger.info(
-                    f"Ignoring message for closed session: session={conversation.session_id}, "
-                    f"user={telegram_user_id}"
+                    "Ignoring message for closed session: session=%s, user=%s",
+                    conversation.session_id, telegram_user_id
                 )
                 # Optionally send a message to the user
                 await self._send_telegram_message(
@@ -158,11 +301,11 @@ class TelegramService:
             if not conversation:
                 # Create new conversation with unique session ID
                 session_id = (
-                    f"telegram-{bot_config.id}-{telegram_user_id}-{uuid4().hex[:8]}"
+                    f"telegram-{bot_config.id}-{telegram_user_id}-{secrets.token_hex(4)}"
                 )
                 logger.info(
-                    f"Creating new conversation: bot_config_id={bot_config.id}, "
-                    f"platform_user_id={telegram_user_id}, session_id={session_id}"
+                    "Creating new conversation: bot_config_id=%s, platform_user_id=%s, session_id=%s",
+                    bot_config.id, telegram_user_id, session_id
                 )
                 conversation = PlatformConversation(
                     bot_config_id=bot_config.id,
@@ -171,10 +314,12 @@ class TelegramService:
                     session_id=session_id,
                 )
                 db.add(conversation)
-                db.commit()
-                db.refresh(conversation)
+                # Flush only to get the id; the conversation is committed
+                # together with the user message below
+                db.flush()
                 logger.info(
-                    f"Created new conversation: id={conversation.id}, session={session_id}"
+                    "Created new conversation: id=%s, session=%s",
+                    conversation.id, session_id
                 )
 
             # Store user message
@@ -182,11 +327,12 @@ class TelegramService:
                 conversation_id=conversation.id,
                 role=ConversationMessageRoles.USER,
                 content=user_message,
-                platform_message_id=str(update.message.message_id),
+                platform_message_id=str(update.message_id),
             )
             db.add(user_msg)
             # Update last_message_at timestamp
             conversation.last_message_at = datetime.now(timezone.utc)
+            # Single commit for the (new) conversation and the user message
             db.commit()
 
             # Process message via WebSocket bidirectional communication
@@ -203,15 +349,15 @@ class TelegramService:
 
             if streaming_success:
                 logger.info(
-                    f"Message processed successfully (streaming): bot={bot_config.id}, "
-                    f"session={conversation.session_id}"
+                    "Message processed successfully (streaming): bot=%s, session=%s",
+                    bot_config.id, conversation.session_id
                 )
                 return True
 
             # WebSocket streaming failed - notify user
             logger.error(
-                f"WebSocket streaming failed for session={conversation.session_id}, "
-                f"no HTTP fallback available"
+                "WebSocket streaming failed for session=%s, no HTTP fallback available",
+                conversation.session_id
             )
             await self._send_telegram_message(
                 bot_config=bot_config,
@@ -221,7 +367,7 @@ class TelegramService:
             return False
 
         except Exception as e:
-            logger.error(f"Error processing Telegram update: {e}", exc_info=True)
+            logger.error("Error processing Telegram update: %s", e, exc_info=True)
             return False
 
     async def _send_telegram_message(
@@ -232,20 +378,20 @@ class TelegramService:
             bot = self.get_bot(bot_config)
 
             # Telegram has a 4096 character limit
-            if len(text) > 4096:
-                # Split long messages
-                chunks = [text[i : i + 4090] for i in range(0, len(text), 4090)]
-                for chunk in chunks:
+            if len(text) > TELEGRAM_MESSAGE_LIMIT:
+                # Split long messages (in order, one request per chunk)
+                for chunk in _iter_chunks(text, 4090):
                     await bot.send_message(chat_id=chat_id, text=chunk)
             else:
                 await bot.send_message(chat_id=chat_id, text=text)
 
             logger.debug(
-                f"Sent Telegram message: chat_id={chat_id}, text_len={len(text)}"
+                "Sent Telegram message: chat_id=%s, text_len=%s",
+                chat_id, len(text)
             )
 
         except Exception as e:
-            logger.error(f"Error sending Telegram message: {e}", exc_info=True)
+            logger.error("Error sending Telegram message: %s", e, exc_info=True)
             raise
 
     async def _send_typing_indicator(self, bot_config: BotConfig, chat_id: int):
@@ -253,9 +399,9 @@ class TelegramService:
         try:
             bot = self.get_bot(bot_config)
             await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
-            logger.debug(f"Sent typing indicator: chat_id={chat_id}")
+            logger.debug("Sent typing indicator: chat_id=%s", chat_id)
         except Exception as e:
-            logger.warning(f"Error sending typing indicator: {e}")
+            logger.warning("Error sending typing indicator: %s", e)
             # Non-critical, don't raise
 
     async def _keep_typing_alive(
@@ -267,14 +413,15 @@ class TelegramService:
                 await self._send_typing_indicator(bot_config, chat_id)
                 # Wait 4 seconds (typing expires at 5s) or until stopped
                 try:
-                    await asyncio.wait_for(stop_event.wait(), timeout=4.0)
+                    async with asyncio.timeout(4.0):
+                        await stop_event.wait()
                     break  # Event was set, stop
-                except asyncio.TimeoutError:
+                except TimeoutError:
                     continue  # Resend typing indicator
         except asyncio.CancelledError:
             logger.debug("Typing indicator task cancelled")
         except Exception as e:
-            logger.warning(f"Error in typing indicator loop: {e}")
+            logger.warning("Error in typing indicator loop: %s", e)
 
     async def _process_with_streaming(
         self,
@@ -293,210 +440,220 @@ class TelegramService:
         """
         try:
             logger.info(
-                f"Starting streaming mode: session={conversation.session_id}, "
-                f"chat_id={chat_id}"
+                "Starting streaming mode: session=%s, chat_id=%s",
+                conversation.session_id, chat_id
             )
 
-            # Start typing indicator
+            # Typing indicator; set stop_typing to make it exit on its own
             stop_typing = asyncio.Event()
-            typing_task = asyncio.create_task(
-                self._keep_typing_alive(bot_config, chat_id, stop_typing)
-            )
 
             # Start listening for assistant messages via WebSocket
             message_count = 0
-            messages_received = []
-            # Improved deduplication: track message hashes instead of exact text
-            # This handles similar messages and allows for better deduplication
-            messages_sent = {}  # Track (message_hash, timestamp) for deduplication
+            # Filled by _handle_websocket_events, which puts None when it finishes
+            messages_received: asyncio.Queue = asyncio.Queue()
+            # Deduplication: short digests of recently sent messages -> send time,
+            # oldest first; entries leave once they fall out of the dedup window
+            messages_sent: "OrderedDict[bytes, float]" = OrderedDict()
             session_id = conversation.session_id
             dedup_window = 5.0  # Increased to 5 seconds for better deduplication
-            messages_to_save = []  # Batch messages for single commit
+            now = asyncio.get_running_loop().time
+            messages_to_save = []  # Batch message rows for a single multi-row INSERT
             
             # Use configurable timeout from settings
             processing_timeout = getattr(settings, 'websocket_timeout', 120.0)
 
             try:
-                # Create task for WebSocket listener (handles both messages and variable extraction)
-                ws_task = asyncio.create_task(
-                    self._handle_websocket_events(
-                        session_id=conversation.session_id,
-                        conversation=conversation,
-                        bot_config=bot_config,
-                        messages_list=messages_received,
-                        db=db
+                # The task group cancels the typing indicator and the WebSocket
+                # listener if anything below fails, and waits for both on exit
+                async with asyncio.TaskGroup() as tg:
+                    typing_task = tg.create_task(
+                        self._keep_typing_alive(bot_config, chat_id, stop_typing)
+                    )
+                    # WebSocket listener (handles both messages and variable extraction)
+                    ws_task = tg.create_task(
+                        self._handle_websocket_events(
+                            session_id=conversation.session_id,
+                            conversation=conversation,
+                            bot_config=bot_config,
+                            messages_queue=messages_received,
+                            db=db
+                        )
                     )
-                )
-
-                # Send user message to engine via WebSocket (bidirectional communication)
-                await engine_ws_client.send_user_message(
-                    session_id=conversation.session_id,
-                    user_message=user_message,
-                    flow_data=flow_data,
-                )
-
-                # Wait for messages to arrive via WebSocket
-                # As messages arrive, send them to Telegram
-                last_check = asyncio.get_event_loop().time()
-
-                while True:
-                    # Check if we have new messages
-                    if len(messages_received) > message_count:
-                        # Reset timeout when new messages arrive
-                        last_check = asyncio.get_event_loop().time()
-                        # New message arrived!
-                        for i in range(message_count, len(messages_received)):
-                            message_text = messages_received[i]
 
-                            # Improved deduplication: Use content hash instead of exact match
-                            # This handles whitespace differences and similar content
-                            message_hash = hashlib.md5(message_text.strip().encode('utf-8')).hexdigest()
-                            current_time = asyncio.get_event_loop().time()
+                    # Send user message to engine via WebSocket (bidirectional communication)
+                    await engine_ws_client.send_user_message(
+                        session_id=conversation.session_id,
+                        user_message=user_message,
+                        flow_data=flow_data,
+                    )
 
-                            # Check for duplicate hash within dedup window
-                            if message_hash in messages_sent:
-                                time_since_sent = (
-                                    current_time - messages_sent[message_hash]["timestamp"]
-                                )
-                                if time_since_sent < dedup_window:
+                    # Wait for messages to arrive via WebSocket
+                    # As messages arrive, send them to Telegram
+                    wait_timeout = processing_timeout
+                    pending = None  # Message taken from the queue that did not fit in the last send
+                    finished = False
+
+                    while not finished:
+                        if pending is not None:
+                            message_text, pending = pending, None
+                        else:
+                            try:
+                                async with asyncio.timeout(wait_timeout):
+                                    message_text = await messages_received.get()
+                            except TimeoutError:
+                                if wait_timeout == processing_timeout:
                                     logger.warning(
-                                        f"Skipping duplicate message (sent {time_since_sent:.2f}s ago): "
-                                        f"session={conversation.session_id}, message_len={len(message_text)}, "
-                                        f"hash={message_hash[:8]}"
+                                        "Streaming timeout after %ss: session=%s",
+                                        processing_timeout, conversation.session_id
+                                    )
+                                    break
+
+                                # The burst is over; restart typing indicator if the
+                                # WebSocket is still connected (more processing might be happening)
+                                if not ws_task.done() and typing_task.done():
+                                    stop_typing.clear()
+                                    typing_task = tg.create_task(
+                                        self._keep_typing_alive(
+                                            bot_config, chat_id, stop_typing
+                                        )
                                     )
-                                    message_count += 1
-                                    continue
-                                else:
-                                    # Outside dedup window - this is a legitimate repeat
                                     logger.debug(
-                                        f"Sending repeated message (last sent {time_since_sent:.2f}s ago, "
-                                        f"hash={message_hash[:8]})"
+                                        "Restarted typing indicator (expecting more messages)"
                                     )
+                                wait_timeout = processing_timeout
+                                continue
+
+                            # Check if WebSocket is done
+                            if message_text is None:
+                                finished = True
+                                break
+
+                        # New message arrived; wait briefly for the rest of the burst
+                        # before showing the typing indicator again
+                        wait_timeout = BURST_WINDOW
+
+                        # Join the messages that are already waiting into one Telegram
+                        # message (up to the Telegram length limit) to save API calls
+                        burst = []
+                        burst_len = 0
+                        while True:
+                            # Deduplication: Use a content digest instead of the text itself
+                            # This handles whitespace differences and similar content
+                            message_hash = hashlib.blake2b(
+                                message_text.strip().encode('utf-8'), digest_size=8
+                            ).digest()
+                            current_time = now()
+
+                            # Forget messages sent before the dedup window; a later
+                            # repeat of them is legitimate
+                            while messages_sent:
+                                oldest_hash, oldest_time = next(iter(messages_sent.items()))
+                                if current_time - oldest_time < dedup_window:
+                                    break
+                                del messages_sent[oldest_hash]
 
-                            # Stop typing before sending message
-                            stop_typing.set()
-                            if not typing_task.done():
-                                typing_task.cancel()
-                                try:
-                                    await typing_task
-                                except asyncio.CancelledError:
-                                    pass
-
-                            await asyncio.sleep(0.1)  # Brief pause
-
-                            # Send message to Telegram
-                            logger.info(
-                                f"📤 Sending message to Telegram: session={conversation.session_id}, "
-                                f"chat_id={chat_id}, message_len={len(message_text)}, "
-                                f'content_preview="{message_text[:100]}..."'
-                            )
-                            await self._send_telegram_message(
-                                bot_config=bot_config,
-                                chat_id=chat_id,
-                                text=message_text,
-                            )
-                            logger.info(
-                                f"✅ Message sent successfully: session={conversation.session_id}, "
-                                f"message_len={len(message_text)}"
-                            )
+                            # Check for duplicate hash within dedup window
+                            sent_at = messages_sent.get(message_hash)
+                            if sent_at is not None:
+                                logger.warning(
+                                    "Skipping duplicate message (sent %.2fs ago): session=%s, message_len=%s, hash=%s",
+                                    current_time - sent_at, conversation.session_id,
+                                    len(message_text), message_hash.hex()
+                                )
+                                message_count += 1
+                            else:
+                                burst.append(message_text)
+                                burst_len += len(message_text) + (2 if len(burst) > 1 else 0)
+                                # Mark as sent; cap the table in case of a long burst
+                                messages_sent[message_hash] = current_time
+                                if len(messages_sent) > DEDUP_MAX_ENTRIES:
+                                    messages_sent.popitem(last=False)
+
+                            if messages_received.empty():
+                                break
+                            next_text = messages_received.get_nowait()
+                            if next_text is None:
+                                finished = True
+                                break
+                            if burst and burst_len + 2 + len(next_text) > TELEGRAM_MESSAGE_LIMIT:
+                                pending = next_text
+                                break
+                            message_text = next_text
+
+                        if not burst:
+                            continue
+
+                        # Stop typing before sending message
+                        stop_typing.set()
+
+                        # Send message to Telegram
+                        text = "\n\n".join(burst)
+                        logger.info(
+                            '📤 Sending message to Telegram: session=%s, chat_id=%s, parts=%s, message_len=%s, content_preview="%.100s..."',
+                            conversation.session_id, chat_id, len(burst), len(text), text
+                        )
+                        await self._send_telegram_message(
+                            bot_config=bot_config,
+                            chat_id=chat_id,
+                            text=text,
+                        )
+                        logger.info(
+                            "✅ Message sent successfully: session=%s, message_len=%s",
+                            conversation.session_id, len(text)
+                        )
 
-                            # Prepare message for database (batch commit later)
-                            assistant_msg = ConversationMessage(
-                                conversation_id=conversation.id,
-                                role="assistant",
-                                content=message_text,
-                            )
-                            messages_to_save.append(assistant_msg)
+                        # Prepare one row per assistant message for database (batch insert later)
+                        for part in burst:
+                            messages_to_save.append({
+                                "conversation_id": conversation.id,
+                                "role": ConversationMessageRoles.ASSISTANT,
+                                "content": part,
+                            })
 
-                            # Mark as sent with timestamp and hash
-                            messages_sent[message_hash] = {
-                                "timestamp": current_time,
-                                "text": message_text[:100]  # Store preview for debugging
-                            }
+                        message_count += len(burst)
+                        logger.info(
+                            "Sent streaming messages up to %s: session=%s, parts=%s, recent_unique=%s",
+                            message_count, conversation.session_id, len(burst), len(messages_sent)
+                        )
 
-                            logger.info(
-                                f"Sent streaming message {message_count + 1}: session={conversation.session_id}, "
-                                f"message_len={len(message_text)}, total_unique={len(messages_sent)}"
-                            )
+                    if finished:
+                        logger.info(
+                            "WebSocket completed: session=%s, messages_sent=%s",
+                            conversation.session_id, message_count
+                        )
 
-                            message_count += 1
-
-                        # Wait a bit to see if more messages arrive quickly
-                        await asyncio.sleep(0.5)
-
-                        # Only restart typing if:
-                        # 1. WebSocket is still connected (more messages might come)
-                        # 2. No new messages arrived during the wait
-                        if (
-                            not ws_task.done()
-                            and len(messages_received) == message_count
-                        ):
-                            # Restart typing indicator (more processing might be happening)
-                            stop_typing.clear()
-                            typing_task = asyncio.create_task(
-                                self._keep_typing_alive(
-                                    bot_config, chat_id, stop_typing
-                                )
-                            )
+                    # Stop typing indicator
+                    stop_typing.set()
+
+                    # Batch commit all messages to database
+                    if messages_to_save:
+                        try:
+                            # One executemany INSERT instead of flushing ORM objects row by row
+                            db.execute(insert(ConversationMessage), messages_to_save)
+                            # Update last_message_at timestamp when messages are saved
+                            conversation.last_message_at = datetime.now(timezone.utc)
+                            db.commit()
                             logger.debug(
-                                "Restarted typing indicator (expecting more messages)"
+                                "Committed %s messages to database",
+                                len(messages_to_save)
                             )
+                        except Exception as e:
+                            logger.error("Failed to commit messages to database: %s", e)
+                            db.rollback()
 
-                    # Check if WebSocket is done
-                    if ws_task.done():
-                        logger.info(
-                            f"WebSocket completed: session={conversation.session_id}, "
-                            f"messages_sent={message_count}"
-                        )
-                        break
-
-                    # Check timeout
-                    elapsed = asyncio.get_event_loop().time() - last_check
-                    if elapsed > processing_timeout:
-                        logger.warning(
-                            f"Streaming timeout after {processing_timeout}s: "
-                            f"session={conversation.session_id}"
-                        )
-                        break
-
-                    # Small delay before checking again
-                    await asyncio.sleep(0.2)
-
-                # Stop typing indicator
-                stop_typing.set()
-                if not typing_task.done():
-                    typing_task.cancel()
-
-                # Batch commit all messages to database
-                if messages_to_save:
-                    try:
-                        for msg in messages_to_save:
-                            db.add(msg)
-                        # Update last_message_at timestamp when messages are saved
-                        conversation.last_message_at = datetime.now(timezone.utc)
-                        db.commit()
+                    # Cancel WebSocket listener task to clean up resources
+                    # (the task group waits for it to finish)
+                    if not ws_task.done():
                         logger.debug(
-                            f"Committed {len(messages_to_save)} messages to database"
+                            "Cancelling WebSocket listener task: session=%s",
+                            conversation.session_id
                         )
-                    except Exception as e:
-                        logger.error(f"Failed to commit messages to database: {e}")
-                        db.rollback()
-
-                # Cancel WebSocket listener task to clean up resources
-                if not ws_task.done():
-                    logger.debug(
-                        f"Cancelling WebSocket listener task: session={conversation.session_id}"
-                    )
-                    ws_task.cancel()
-                    try:
-                        await ws_task
-                    except asyncio.CancelledError:
-                        pass
+                        ws_task.cancel()
 
                 success = message_count > 0
                 logger.info(
-                    f"Streaming completed: session={conversation.session_id}, "
-                    f"messages={message_count}, success={success}"
+                    "Streaming completed: session=%s, messages=%s, success=%s",
+                    conversation.session_id, message_count, success
                 )
 
                 # Return True if at least one message was sent via WebSocket
@@ -504,30 +661,41 @@ class TelegramService:
                 return success
 
             except Exception as e:
-                logger.error(f"Error in streaming processing: {e}", exc_info=True)
-                # Stop typing on error
-                stop_typing.set()
-                if not typing_task.done():
-                    typing_task.cancel()
-                # Cancel WebSocket task on error
-                if "ws_task" in locals() and not ws_task.done():
-                    ws_task.cancel()
-                    try:
-                        await ws_task
-                    except asyncio.CancelledError:
-                        pass
+                # The task group has already cancelled the typing indicator
+                # and the WebSocket listener
+                logger.error("Error in streaming processing: %s", e, exc_info=True)
                 return False
 
         except Exception as e:
-            logger.error(f"Failed to start streaming mode: {e}", exc_info=True)
+            logger.error("Failed to start streaming mode: %s", e, exc_info=True)
             return False
 
+    async def _persist_variables(
+        self,
+        db: Session,
+        conversation: PlatformConversation,
+        bot_config: BotConfig,
+        pending_variables: list,
+    ):
+        """Write and clear the buffered variable extractions"""
+        try:
+            await persist_variables(
+                db=db,
+                conversation_id=conversation.id,
+                flow_id=bot_config.flow_id,
+                variables=pending_variables,
+            )
+        except Exception as e:
+            # Don't fail the entire message processing if variable persistence fails
+            logger.error("Failed to persist variables: %s", e, exc_info=True)
+        pending_variables.clear()
+
     async def _handle_websocket_events(
         self,
         session_id: str,
         conversation: PlatformConversation,
         bot_config: BotConfig,
-        messages_list: list,
+        messages_queue: asyncio.Queue,
         db: Session
     ):
         """
@@ -535,22 +703,23 @@ class TelegramService:
 
         This method listens to the raw WebSocket event stream and handles:
         - variable_extracted events → persist to database
-        - assistant_message events → append to messages list
+        - assistant_message events → put on the messages queue
+
+        ``None`` is put on the queue once the handler stops.
         """
+        pending_variables = []  # Extracted variables not yet written
         try:
-            logger.info(f"🎧 Starting to collect events: session={session_id}")
+            logger.info("🎧 Starting to collect events: session=%s", session_id)
 
             # Get the WebSocket client's raw event listener
             # We'll create a queue and manually register it like listen_for_assistant_messages does
-            queue = asyncio.Queue()
+            queue = ListenerQueue(event_types=CONVERSATION_EVENTS)
 
-            if session_id not in engine_ws_client._message_queues:
-                engine_ws_client._message_queues[session_id] = []
-            engine_ws_client._message_queues[session_id].append(queue)
+            total_listeners = engine_ws_client.register_listener(session_id, queue)
 
             logger.info(
-                f"🔔 REGISTERED event handler for session={session_id}, "
-                f"total_listeners={len(engine_ws_client._message_queues[session_id])}"
+                "🔔 REGISTERED event handler for session=%s, total_listeners=%s",
+                session_id, total_listeners
             )
 
             # Ensure connection exists
@@ -558,11 +727,16 @@ class TelegramService:
 
             # Read events from queue
             while True:
+                # Variables that arrived together are written in one statement,
+                # before waiting for more events
+                if pending_variables and queue.empty():
+                    await self._persist_variables(db, conversation, bot_config, pending_variables)
+
                 event = await queue.get()
 
                 # Check for sentinel value (connection closed)
                 if event is None:
-                    logger.debug(f"Connection closed, stopping event handler: session={session_id}")
+                    logger.debug("Connection closed, stopping event handler: session=%s", session_id)
                     break
 
                 event_type = event.get("event_type")
@@ -574,70 +748,48 @@ class TelegramService:
                     variable_value = event.get("variable_value")
 
                     if variable_name and variable_value is not None:
-                        try:
-                            logger.info(
-                                f"💾 Persisting variable: session={session_id}, "
-                                f"variable={variable_name}, value={variable_value}, node={node_id}"
-                            )
-                            await persist_variable(
-                                db=db,
-                                conversation_id=conversation.id,
-                                node_id=node_id,
-                                flow_id=bot_config.flow_id,
-                                variable_name=variable_name,
-                                variable_value=variable_value,
-                                variable_type=type(variable_value).__name__
-                            )
-                            logger.info(f"✅ Variable persisted: {variable_name}")
-                        except Exception as e:
-                            logger.error(
-                                f"Failed to persist variable {variable_name}: {e}",
-                                exc_info=True
-                            )
-                            # Don't fail the entire message processing if variable persistence fails
+                        logger.info(
+                            "💾 Persisting variable: session=%s, variable=%s, value=%s, node=%s",
+                            session_id, variable_name, variable_value, node_id
+                        )
+                        pending_variables.append({
+                            "node_id": node_id,
+                            "variable_name": variable_name,
+                            "variable_value": variable_value,
+                        })
 
                 # Handle assistant message events
                 elif event_type == "assistant_message":
                     message = event.get("message", "")
                     if message:
-                        messages_list.append(message)
-                        logger.debug(
-                            f"Collected message: session={session_id}, total={len(messages_list)}"
-                        )
+                        messages_queue.put_nowait(message)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(
+                                "Collected message: session=%s, pending=%s",
+                                session_id, messages_queue.qsize()
+                            )
 
                 # Break on completion events
-                elif event_type in ("session_ended", "error", "message_processing_complete"):
+                elif event_type in TERMINAL_EVENTS:
                     logger.info(
-                        f"Event handler ending: type={event_type}, session={session_id}"
+                        "Event handler ending: type=%s, session=%s",
+                        event_type, session_id
                     )
                     break
 
         except Exception as e:
-            logger.info(f"🛑 Stopped collecting events: session={session_id}")
-            logger.error(f"Error collecting events from WebSocket: {e}", exc_info=True)
-            raise
+            logger.info("🛑 Stopped collecting events: session=%s", session_id)
+            # Not re-raised: the consumer already gets None below and keeps
+            # what was streamed so far
+            logger.error("Error collecting events from WebSocket: %s", e, exc_info=True)
         finally:
             # Clean up queue registration
-            if (session_id in engine_ws_client._message_queues and
-                queue in engine_ws_client._message_queues[session_id]):
-                engine_ws_client._message_queues[session_id].remove(queue)
-                logger.debug(f"Unregistered event handler queue: session={session_id}")
-
-    async def _collect_assistant_messages(self, session_id: str, messages_list: list):
-        """Collect assistant messages from WebSocket and append to list"""
-        try:
-            logger.info(f"🎧 Starting to collect messages: session={session_id}")
-            async for message in engine_ws_client.listen_for_assistant_messages(
-                session_id
-            ):
-                messages_list.append(message)
-                logger.debug(
-                    f"Collected message: session={session_id}, total={len(messages_list)}"
-                )
-        except Exception as e:
-            logger.info(f"🛑 Stopped collecting messages: session={session_id}")
-            logger.error(f"Error collecting messages from WebSocket: {e}", exc_info=True)
-            raise
+            engine_ws_client.unregister_listener(session_id, queue)
+            if pending_variables:
+                await self._persist_variables(db, conversation, bot_config, pending_variables)
+            # Wake the consumer so it does not wait for the full timeout
+            messages_queue.put_nowait(None)
+            logger.debug("Unregistered event handler queue: session=%s", session_id)
 
 
 # Singleton instance
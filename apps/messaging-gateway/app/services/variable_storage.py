@@ -6,9 +6,10 @@ allowing for historical tracking and analytics.
 """
 
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from app.models.bot_config import ExtractedVariable
@@ -16,6 +17,24 @@ from app.models.bot_config import ExtractedVariable
 logger = logging.getLogger(__name__)
 
 
+def _upsert_statement(rows: List[Dict[str, Any]]):
+    """INSERT ... ON CONFLICT (conversation_id, variable_name) DO UPDATE for the rows"""
+    stmt = insert(ExtractedVariable).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            ExtractedVariable.conversation_id,
+            ExtractedVariable.variable_name,
+        ],
+        set_={
+            "variable_value": stmt.excluded.variable_value,
+            "variable_type": stmt.excluded.variable_type,
+            "node_id": stmt.excluded.node_id,
+            "flow_id": stmt.excluded.flow_id,
+            "extracted_at": func.now(),
+        },
+    )
+
+
 async def persist_variable(
     db: Session,
     conversation_id: int,
@@ -47,52 +66,83 @@ async def persist_variable(
         Exception: If database operation fails
     """
     try:
-        # Check if variable already exists (update scenario)
-        existing = (
-            db.query(ExtractedVariable)
-            .filter(
-                ExtractedVariable.conversation_id == conversation_id,
-                ExtractedVariable.variable_name == variable_name,
-            )
-            .first()
+        # Single INSERT ... ON CONFLICT instead of SELECT then UPDATE/INSERT
+        stmt = _upsert_statement([{
+            "conversation_id": conversation_id,
+            "node_id": node_id,
+            "flow_id": flow_id,
+            "variable_name": variable_name,
+            "variable_value": variable_value,
+            "variable_type": variable_type or type(variable_value).__name__,
+        }]).returning(ExtractedVariable)
+
+        variable = db.execute(stmt).scalar_one()
+        db.commit()
+        logger.info(
+            "Persisted variable '%s' for conversation %s (value: %s)",
+            variable_name, conversation_id, variable_value
         )
+        return variable
 
-        if existing:
-            # Update existing variable
-            existing.variable_value = variable_value
-            existing.variable_type = variable_type or type(variable_value).__name__
-            existing.node_id = node_id
-            existing.flow_id = flow_id
-            existing.extracted_at = func.now()
-            db.commit()
-            db.refresh(existing)
-            logger.info(
-                f"Updated variable '{variable_name}' for conversation {conversation_id} "
-                f"(value: {variable_value})"
-            )
-            return existing
-        else:
-            # Create new variable record
-            new_var = ExtractedVariable(
-                conversation_id=conversation_id,
-                node_id=node_id,
-                flow_id=flow_id,
-                variable_name=variable_name,
-                variable_value=variable_value,
-                variable_type=variable_type or type(variable_value).__name__,
-            )
-            db.add(new_var)
-            db.commit()
-            db.refresh(new_var)
-            logger.info(
-                f"Persisted new variable '{variable_name}' for conversation {conversation_id} "
-                f"(value: {variable_value})"
-            )
-            return new_var
+    except Exception as e:
+        logger.error(
+            "Failed to persist variable '%s' for conversation %s: %s",
+            variable_name, conversation_id, e
+        )
+        db.rollback()
+        raise
+
+
+async def persist_variables(
+    db: Session,
+    conversation_id: int,
+    flow_id: Optional[int],
+    variables: List[Dict[str, Any]],
+) -> int:
+    """
+    Persist several extracted variables with one statement and one commit.
+
+    Args:
+        db: Database session
+        conversation_id: ID of the platform conversation
+        flow_id: ID of the flow that was active
+        variables: Dicts with ``variable_name``, ``variable_value`` and ``node_id``,
+            in extraction order; a later value for the same name wins
+
+    Returns:
+        Number of variables written
+
+    Raises:
+        Exception: If database operation fails
+    """
+    # One row per name: a statement may not update the same row twice
+    rows: Dict[str, Dict[str, Any]] = {}
+    for variable in variables:
+        variable_value = variable["variable_value"]
+        rows[variable["variable_name"]] = {
+            "conversation_id": conversation_id,
+            "node_id": variable["node_id"],
+            "flow_id": flow_id,
+            "variable_name": variable["variable_name"],
+            "variable_value": variable_value,
+            "variable_type": type(variable_value).__name__,
+        }
+    if not rows:
+        return 0
+
+    try:
+        db.execute(_upsert_statement(list(rows.values())))
+        db.commit()
+        logger.info(
+            "Persisted %s variable(s) for conversation %s: %s",
+            len(rows), conversation_id, ", ".join(rows)
+        )
+        return len(rows)
 
     except Exception as e:
         logger.error(
-            f"Failed to persist variable '{variable_name}' for conversation {conversation_id}: {e}"
+            "Failed to persist variables %s for conversation %s: %s",
+            ", ".join(rows), conversation_id, e
         )
         db.rollback()
         raise
@@ -112,19 +162,21 @@ async def get_conversation_variables(
         Dict mapping variable names to their values
     """
     try:
-        variables = (
-            db.query(ExtractedVariable)
+        # Only the two columns are needed, so skip building ORM objects
+        rows = (
+            db.query(ExtractedVariable.variable_name, ExtractedVariable.variable_value)
             .filter(ExtractedVariable.conversation_id == conversation_id)
             .order_by(ExtractedVariable.extracted_at.desc())
             .all()
         )
 
         # Return as dict (variable_name -> variable_value)
-        return {var.variable_name: var.variable_value for var in variables}
+        return dict(rows)
 
     except Exception as e:
         logger.error(
-            f"Failed to retrieve variables for conversation {conversation_id}: {e}"
+            "Failed to retrieve variables for conversation %s: %s",
+            conversation_id, e
         )
         return {}
 
@@ -144,10 +196,19 @@ async def get_conversation_variables_with_metadata(
     """
     try:
         variables = (
-            db.query(ExtractedVariable)
+            db.query(
+                ExtractedVariable.id,
+                ExtractedVariable.variable_name,
+                ExtractedVariable.variable_value,
+                ExtractedVariable.variable_type,
+                ExtractedVariable.node_id,
+                ExtractedVariable.flow_id,
+                ExtractedVariable.extracted_at,
+            )
             .filter(ExtractedVariable.conversation_id == conversation_id)
             .order_by(ExtractedVariable.extracted_at.desc())
-            .all()
+            # Stream rows in batches instead of materializing them all first
+            .yield_per(1000)
         )
 
         return [
@@ -165,6 +226,7 @@ async def get_conversation_variables_with_metadata(
 
     except Exception as e:
         logger.error(
-            f"Failed to retrieve variable metadata for conversation {conversation_id}: {e}"
+            "Failed to retrieve variable metadata for conversation %s: %s",
+            conversation_id, e
         )
         return []
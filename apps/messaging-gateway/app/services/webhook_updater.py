@@ -5,7 +5,7 @@ Updates webhook URLs when ngrok URL changes (e.g., on service restart).
 """
 import logging
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, Tuple
 import asyncio
 
 from ..models import BotConfig
@@ -15,6 +15,66 @@ from easypath_shared.constants import BotStatus, MessagingPlatform
 
 logger = logging.getLogger(__name__)
 
+# Bot API calls in flight at once while registering webhooks on startup
+WEBHOOK_UPDATE_CONCURRENCY = 20
+
+
+async def _update_bot_webhook(
+    bot: BotConfig, webhook_base_url: str
+) -> Tuple[str, Optional[bool]]:
+    """
+    Register the webhook of one bot with its platform.
+
+    The bot record is left untouched; the caller stores the URL.
+
+    Returns:
+        The webhook URL, and True if updated, False if it failed,
+        None if the platform was skipped
+    """
+    # Construct webhook URL for this bot
+    webhook_url = f"{webhook_base_url}/webhooks/{bot.platform}/{bot.id}"
+
+    try:
+        logger.info(
+            f"Updating webhook for bot '{bot.bot_name}' (id={bot.id}, "
+            f"platform={bot.platform})"
+        )
+
+        # Update webhook based on platform
+        if bot.platform == MessagingPlatform.TELEGRAM:
+            success = await telegram_service.set_webhook(bot, webhook_url)
+
+            if success:
+                logger.info(
+                    f"✓ Webhook updated successfully for bot '{bot.bot_name}': "
+                    f"{webhook_url}"
+                )
+                return webhook_url, True
+
+            logger.error(
+                f"✗ Failed to set webhook for bot '{bot.bot_name}' (id={bot.id})"
+            )
+            return webhook_url, False
+
+        elif bot.platform == MessagingPlatform.WHATSAPP:
+            # WhatsApp webhook setup will be implemented later
+            logger.info(
+                f"⊘ Skipping WhatsApp bot '{bot.bot_name}' - not yet implemented"
+            )
+
+        else:
+            logger.warning(
+                f"⊘ Unknown platform '{bot.platform}' for bot '{bot.bot_name}'"
+            )
+        return webhook_url, None
+
+    except Exception as e:
+        logger.error(
+            f"✗ Error updating webhook for bot '{bot.bot_name}' (id={bot.id}): {e}",
+            exc_info=True
+        )
+        return webhook_url, False
+
 
 async def update_all_webhooks(webhook_base_url: Optional[str] = None):
     """
@@ -49,57 +109,30 @@ async def update_all_webhooks(webhook_base_url: Optional[str] = None):
 
         logger.info(f"Found {len(active_bots)} active bot(s) to update")
 
-        success_count = 0
-        failure_count = 0
+        # Register all webhooks concurrently, a few at a time
+        slots = asyncio.Semaphore(WEBHOOK_UPDATE_CONCURRENCY)
 
-        for bot in active_bots:
-            try:
-                # Construct webhook URL for this bot
-                webhook_url = f"{webhook_base_url}/webhooks/{bot.platform}/{bot.id}"
+        async def update_with_slot(bot: BotConfig) -> Tuple[str, Optional[bool]]:
+            async with slots:
+                return await _update_bot_webhook(bot, webhook_base_url)
 
-                logger.info(
-                    f"Updating webhook for bot '{bot.bot_name}' (id={bot.id}, "
-                    f"platform={bot.platform})"
-                )
+        results = await asyncio.gather(*(update_with_slot(bot) for bot in active_bots))
 
-                # Update webhook based on platform
-                if bot.platform == MessagingPlatform.TELEGRAM:
-                    success = await telegram_service.set_webhook(bot, webhook_url)
-
-                    if success:
-                        # Update database record
-                        bot.webhook_url = webhook_url
-                        db.commit()
-
-                        logger.info(
-                            f"✓ Webhook updated successfully for bot '{bot.bot_name}': "
-                            f"{webhook_url}"
-                        )
-                        success_count += 1
-                    else:
-                        logger.error(
-                            f"✗ Failed to set webhook for bot '{bot.bot_name}' (id={bot.id})"
-                        )
-                        failure_count += 1
-
-                elif bot.platform == MessagingPlatform.WHATSAPP:
-                    # WhatsApp webhook setup will be implemented later
-                    logger.info(
-                        f"⊘ Skipping WhatsApp bot '{bot.bot_name}' - not yet implemented"
-                    )
-
-                else:
-                    logger.warning(
-                        f"⊘ Unknown platform '{bot.platform}' for bot '{bot.bot_name}'"
-                    )
-
-            except Exception as e:
-                logger.error(
-                    f"✗ Error updating webhook for bot '{bot.bot_name}' (id={bot.id}): {e}",
-                    exc_info=True
-                )
+        # Store the new URLs from here, so only this coroutine touches the session
+        success_count = 0
+        failure_count = 0
+        for bot, (webhook_url, success) in zip(active_bots, results):
+            if success:
+                bot.webhook_url = webhook_url
+                success_count += 1
+            elif success is False:
                 failure_count += 1
 
+        # Single commit for all updated webhook URLs; a commit per bot would
+        # also expire the remaining bots and reload each one from the database
+        if success_count:
+            db.commit()
+
         # Summary
         logger.info(
             f"Webhook update complete: {success_count} successful, "
@@ -110,11 +143,3 @@ async def update_all_webhooks(webhook_base_url: Optional[str] = None):
         logger.error(f"Error during webhook update process: {e}", exc_info=True)
     finally:
         db.close()
-
-
-def sync_update_all_webhooks(webhook_base_url: Optional[str] = None):
-    """
-    Synchronous wrapper for update_all_webhooks.
-    Used for startup events.
-    """
-    asyncio.run(update_all_webhooks(webhook_base_url))
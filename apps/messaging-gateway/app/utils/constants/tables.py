@@ -1,10 +0,0 @@
-"""Database table name constants."""
-
-
-class TableNames:
-    """Centralized database table names for consistency across the application."""
-    
-    BOT_CONFIGS = "bot_configs"
-    PLATFORM_CONVERSATIONS = "platform_conversations"
-    CONVERSATION_MESSAGES = "conversation_messages"
-
@@ -5,6 +5,9 @@ Converts between Canvas format (from platform database) and Engine format.
 """
 from typing import Dict, Any, List, Optional
 
+# Canvas node types that never call the LLM
+_NON_LLM_TYPES = frozenset({"start", "end"})
+
 
 def is_canvas_format(flow_data: Dict[str, Any]) -> bool:
     """Check if flow data is in canvas format (frontend)"""
@@ -43,9 +46,8 @@ def convert_canvas_to_engine(canvas_flow: Dict[str, Any]) -> Dict[str, Any]:
     edges = canvas_flow.get("edges", [])
     global_config = canvas_flow.get("globalConfig", {})
 
-    # Find start node
-    start_node = next((n for n in nodes if n.get("data", {}).get("isStart")), None)
-    first_node_id = start_node["id"] if start_node else (nodes[0]["id"] if nodes else "")
+    # Start node is picked up while converting, falling back to the first node
+    first_node_id = ""
 
     # Convert nodes
     engine_nodes = []
@@ -54,6 +56,9 @@ def convert_canvas_to_engine(canvas_flow: Dict[str, Any]) -> Dict[str, Any]:
         node_type = node.get("type", "normal")
         data = node.get("data", {})
 
+        if data.get("isStart") and not first_node_id:
+            first_node_id = node_id
+
         # Extract prompt data
         prompt_data = data.get("prompt", {})
 
@@ -85,7 +90,7 @@ def convert_canvas_to_engine(canvas_flow: Dict[str, Any]) -> Dict[str, Any]:
             },
             "is_start": data.get("isStart", False),
             "is_end": is_end,
-            "use_llm": node_type not in ["start", "end"],
+            "use_llm": node_type not in _NON_LLM_TYPES,
             "is_global": data.get("isGlobal", False),
             "node_description": data.get("nodeDescription", ""),
             "auto_return_to_previous": data.get("autoReturnToPrevious", False),
@@ -99,6 +104,9 @@ def convert_canvas_to_engine(canvas_flow: Dict[str, Any]) -> Dict[str, Any]:
 
         engine_nodes.append(engine_node)
 
+    if not first_node_id and nodes:
+        first_node_id = nodes[0]["id"]
+
     # Convert edges to connections
     engine_connections = []
     for edge in edges:
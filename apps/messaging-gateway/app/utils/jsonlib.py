@@ -0,0 +1,28 @@
+"""JSON encoding helpers backed by orjson, falling back to the standard library."""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+
+    # Accepts str and bytes; decode errors subclass json.JSONDecodeError
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> str:
+        """Serialize to a compact JSON string."""
+        return orjson.dumps(obj).decode()
+
+    def dumps_sorted(obj: Any) -> str:
+        """Serialize to a compact JSON string with sorted keys (stable for hashing)."""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+except ImportError:  # pragma: no cover - orjson is optional
+    loads = json.loads
+
+    def dumps(obj: Any) -> str:
+        """Serialize to a compact JSON string."""
+        return json.dumps(obj, separators=(",", ":"))
+
+    def dumps_sorted(obj: Any) -> str:
+        """Serialize to a compact JSON string with sorted keys (stable for hashing)."""
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"))
@@ -6,7 +6,6 @@ Runs SQL migrations on service startup.
 
 import logging
 from pathlib import Path
-from sqlalchemy import text
 from ..database import engine
 
 logger = logging.getLogger(__name__)
@@ -48,10 +47,11 @@ def run_migrations():
                 logger.warning(f"Skipping empty migration file: {migration_file.name}")
                 continue
 
-            # Execute migration
+            # Execute migration: the whole file goes to the driver as one
+            # multi-statement string, in one transaction and one round trip
             with engine.begin() as conn:
                 logger.info(f"Executing migration: {migration_file.name}")
-                _ = conn.execute(text(migration_sql))
+                _ = conn.exec_driver_sql(migration_sql)
 
             logger.info(f"✓ Migration completed: {migration_file.name}")
 
@@ -0,0 +1,62 @@
+-- Migration 006: Store enum columns as SMALLINT codes
+-- Description: bot_configs.is_active, platform_conversations.status and
+-- conversation_messages.role are stored as SMALLINT instead of native enum types.
+-- Codes follow the declaration order of the Python enums (starting at 1),
+-- see app/models/types.py (IntEnumType).
+
+DO $$
+BEGIN
+    -- bot_configs.is_active: ACTIVE=1, INACTIVE=2
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'bot_configs'
+        AND column_name = 'is_active'
+        AND data_type <> 'smallint'
+    ) THEN
+        ALTER TABLE bot_configs ALTER COLUMN is_active DROP DEFAULT;
+        ALTER TABLE bot_configs
+            ALTER COLUMN is_active TYPE SMALLINT
+            USING CASE is_active::text
+                WHEN 'INACTIVE' THEN 2
+                ELSE 1
+            END;
+        ALTER TABLE bot_configs ALTER COLUMN is_active SET DEFAULT 1;
+    END IF;
+
+    -- platform_conversations.status: ACTIVE=1, INACTIVE=2, ARCHIVED=3
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'platform_conversations'
+        AND column_name = 'status'
+        AND data_type <> 'smallint'
+    ) THEN
+        ALTER TABLE platform_conversations ALTER COLUMN status DROP DEFAULT;
+        ALTER TABLE platform_conversations
+            ALTER COLUMN status TYPE SMALLINT
+            USING CASE status::text
+                WHEN 'INACTIVE' THEN 2
+                WHEN 'ARCHIVED' THEN 3
+                ELSE 1
+            END;
+        ALTER TABLE platform_conversations ALTER COLUMN status SET DEFAULT 1;
+    END IF;
+
+    -- conversation_messages.role: USER=1, ASSISTANT=2
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'conversation_messages'
+        AND column_name = 'role'
+        AND data_type <> 'smallint'
+    ) THEN
+        ALTER TABLE conversation_messages
+            ALTER COLUMN role TYPE SMALLINT
+            USING CASE role::text
+                WHEN 'ASSISTANT' THEN 2
+                ELSE 1
+            END;
+    END IF;
+END $$;
+
+COMMENT ON COLUMN bot_configs.is_active IS 'Bot status code: 1=ACTIVE, 2=INACTIVE';
+COMMENT ON COLUMN platform_conversations.status IS 'Session status code: 1=ACTIVE, 2=INACTIVE, 3=ARCHIVED';
+COMMENT ON COLUMN conversation_messages.role IS 'Message role code: 1=USER, 2=ASSISTANT';
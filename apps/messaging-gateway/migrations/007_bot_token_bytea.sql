@@ -0,0 +1,20 @@
+-- Migration 007: Store encrypted bot tokens as BYTEA
+-- Description: Tokens are stored as raw bytes: a versioned AES-GCM blob
+-- (0x01 || nonce || ciphertext || tag), or a legacy Fernet token that is still
+-- readable. BYTEA avoids encoding/decoding TEXT on every access.
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'bot_configs'
+        AND column_name = 'bot_token_encrypted'
+        AND data_type <> 'bytea'
+    ) THEN
+        ALTER TABLE bot_configs
+            ALTER COLUMN bot_token_encrypted TYPE BYTEA
+            USING convert_to(bot_token_encrypted, 'UTF8');
+    END IF;
+END $$;
+
+COMMENT ON COLUMN bot_configs.bot_token_encrypted IS 'Encrypted bot token: 0x01 || nonce || AES-GCM ciphertext || tag, or a legacy Fernet token';
@@ -0,0 +1,22 @@
+-- Migration 008: One extracted_variables row per conversation and variable name
+-- Description: persist_variable upserts with INSERT ... ON CONFLICT on
+-- (conversation_id, variable_name), which needs a unique index on those columns.
+-- Duplicates left by concurrent extractions keep only their newest row.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE tablename = 'extracted_variables'
+        AND indexname = 'uq_extracted_vars_conversation_name'
+    ) THEN
+        DELETE FROM extracted_variables older
+        USING extracted_variables newer
+        WHERE older.conversation_id = newer.conversation_id
+        AND older.variable_name = newer.variable_name
+        AND older.id < newer.id;
+
+        CREATE UNIQUE INDEX uq_extracted_vars_conversation_name
+            ON extracted_variables(conversation_id, variable_name);
+    END IF;
+END $$;
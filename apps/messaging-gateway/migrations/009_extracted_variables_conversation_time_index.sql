@@ -0,0 +1,7 @@
+-- Migration 009: Index extracted variables by conversation and extraction time
+-- Description: The variable getters filter by conversation_id and order by
+-- extracted_at DESC; this index serves both without a separate sort.
+-- The (conversation_id, variable_name) lookup is covered by migration 008.
+
+CREATE INDEX IF NOT EXISTS idx_extracted_vars_conversation_time
+    ON extracted_variables(conversation_id, extracted_at DESC);
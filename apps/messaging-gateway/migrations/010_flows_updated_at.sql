@@ -0,0 +1,8 @@
+-- Migration 010: Version column on the platform's flows table
+-- Description: The webhook handler caches flows converted to engine format and
+-- checks flows.updated_at to tell whether the cached copy is current. The
+-- platform backend's Flow model declares the column and bumps it on every
+-- write; this migration adds it to tables created before it existed.
+
+ALTER TABLE IF EXISTS flows
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT now();
@@ -0,0 +1,17 @@
+-- Migration 011: Store the platform's flows.flow_data as JSONB
+-- Description: Flows created before the platform model declared flow_data as
+-- JSONB store it as json text. Convert them once; the ALTER rewrites the table,
+-- so it only runs while the column is still json.
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'flows'
+        AND column_name = 'flow_data'
+        AND data_type = 'json'
+    ) THEN
+        ALTER TABLE flows
+            ALTER COLUMN flow_data TYPE jsonb USING flow_data::jsonb;
+    END IF;
+END $$;
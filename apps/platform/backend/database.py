@@ -2,13 +2,33 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+from dotenv import load_dotenv
+
+# Read .env here: this module is imported before main.py's own setup runs
+load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sized for FastAPI's threadpool; pre-ping replaces connections the server dropped
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+# Handlers return the objects they just wrote; keeping them loaded after
+# commit avoids a SELECT per response (sessions live for one request)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
 Base = declarative_base()
 
+# Dependency
+# Sessions are synchronous: handlers that use get_db must be plain `def` so
+# FastAPI runs them in its threadpool; an `async def` handler would block the
+# event loop on every query
 def get_db():
     db = SessionLocal()
     try:
@@ -1,15 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Column, DateTime, Integer, String, case, func, insert
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
 from pydantic import BaseModel
 import os
 import logging
 import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from dotenv import load_dotenv
 from app.core.logging_config import setup_logging
 from easypath_shared.constants import TableNames
+from database import Base, engine, get_db
 
 load_dotenv()
 
@@ -17,19 +21,19 @@ load_dotenv()
 setup_logging(log_level=os.getenv("LOG_LEVEL", "INFO"), log_dir="logs")
 logger = logging.getLogger(__name__)
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
 # SQLAlchemy Models
 class Flow(Base):
     __tablename__ = TableNames.FLOWS
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String)
-    flow_data = Column(JSON)
+    flow_data = Column(JSONB)
+    # Bumped on every write; the messaging gateway uses it as the version of
+    # the engine-format flow it caches (added to older tables by the gateway's
+    # migration 010)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
 
 Base.metadata.create_all(bind=engine)
 
@@ -46,12 +50,22 @@ class FlowSchema(FlowBase):
     id: int
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
-app = FastAPI(title="EasyPath Platform API", version="1.0.0")
+# Responses carry whole flow_data documents; orjson encodes them much faster
+app = FastAPI(
+    title="EasyPath Platform API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+)
 
 # CORS Configuration
-cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
+# Stripped so "a, b" style values still match the browser's Origin exactly
+cors_origins = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
@@ -61,132 +75,181 @@ app.add_middleware(
 )
 
 # Request/Response Logging Middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-
-    # Log incoming request
-    logger.info(
-        f"Incoming request: method={request.method} path={request.url.path} "
-        f"client={request.client.host if request.client else 'unknown'}"
-    )
-
-    # Process request
-    response = await call_next(request)
-
-    # Calculate duration
-    duration = time.time() - start_time
+# Plain ASGI middleware: @app.middleware("http") would run every request
+# through BaseHTTPMiddleware's extra task and memory streams.
+# Runs on the event loop for every request: keep database calls out of it
+class RequestLoggingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        method = scope["method"]
+        path = scope["path"]
+        client = scope.get("client")
+
+        # Log incoming request (lazy formatting: skipped when INFO is disabled)
+        logger.info(
+            "Incoming request: method=%s path=%s client=%s",
+            method, path, client[0] if client else "unknown",
+        )
 
-    # Log response
-    logger.info(
-        f"Request completed: method={request.method} path={request.url.path} "
-        f"status_code={response.status_code} duration={duration:.3f}s"
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            # Process request
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Calculate duration
+            duration = time.perf_counter() - start_time
+
+            # Log response
+            logger.info(
+                "Request completed: method=%s path=%s status_code=%s duration=%.3fs",
+                method, path, status_code, duration,
+            )
+
+app.add_middleware(RequestLoggingMiddleware)
+
+# Unhandled errors from any endpoint are answered here; the session is
+# rolled back when get_db closes it. Starlette re-raises the exception
+# afterwards and uvicorn logs its traceback, so only a summary is logged here
+@app.exception_handler(Exception)
+async def log_unhandled_error(request: Request, exc: Exception):
+    logger.error(
+        "Request failed: method=%s path=%s error=%s",
+        request.method, request.url.path, exc,
     )
-
-    return response
-
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    return ORJSONResponse(status_code=500, content={"detail": "Internal Server Error"})
 
 @app.post("/flows/", response_model=FlowSchema)
 def create_flow(flow: FlowCreate, db: Session = Depends(get_db)):
     logger.info(f"Creating new flow: name='{flow.name}', description='{flow.description}'")
-    try:
-        db_flow = Flow(**flow.dict())
-        db.add(db_flow)
-        db.commit()
-        db.refresh(db_flow)
-        logger.info(f"Flow created successfully: flow_id={db_flow.id}, name='{db_flow.name}'")
-        return db_flow
-    except Exception as e:
-        logger.error(f"Failed to create flow: name='{flow.name}', error={str(e)}", exc_info=True)
-        db.rollback()
-        raise
+    db_flow = Flow(**flow.model_dump())
+    db.add(db_flow)
+    # The INSERT returns the new id; updated_at is server-generated too but is
+    # not part of FlowSchema, so the flow isn't reloaded for it
+    db.commit()
+    logger.info(f"Flow created successfully: flow_id={db_flow.id}, name='{db_flow.name}'")
+    return db_flow
+
+@app.post("/flows/bulk", response_model=list[FlowSchema])
+def create_flows(flows: list[FlowCreate], db: Session = Depends(get_db)):
+    """Create several flows with one batched INSERT ... RETURNING and one commit."""
+    logger.info(f"Creating {len(flows)} flow(s) in bulk")
+    if not flows:
+        return []
+    db_flows = db.scalars(
+        insert(Flow).returning(Flow), [flow.model_dump() for flow in flows]
+    ).all()
+    db.commit()
+    logger.info(f"Flows created successfully: flow_ids={[db_flow.id for db_flow in db_flows]}")
+    return db_flows
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def flow_etag(flow_id: int, updated_at: Optional[datetime]) -> str:
+    """ETag of a flow version: its id and updated_at in microseconds."""
+    version = (updated_at - EPOCH) // timedelta(microseconds=1) if updated_at else 0
+    return f'"{flow_id}-{version}"'
+
+def etag_versions(flow_id: int, if_none_match: str) -> list[datetime]:
+    """updated_at values named by the If-None-Match ETags of this flow."""
+    prefix = f'"{flow_id}-'
+    versions = []
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag.startswith(prefix) and tag.endswith('"'):
+            try:
+                versions.append(EPOCH + timedelta(microseconds=int(tag[len(prefix):-1])))
+            except ValueError:
+                continue
+    return versions
 
 @app.get("/flows/{flow_id}", response_model=FlowSchema)
-def read_flow(flow_id: int, db: Session = Depends(get_db)):
+def read_flow(
+    flow_id: int, request: Request, response: Response, db: Session = Depends(get_db)
+):
     logger.info(f"Retrieving flow: flow_id={flow_id}")
-    try:
-        db_flow = db.query(Flow).filter(Flow.id == flow_id).first()
-        if db_flow is None:
-            logger.warning(f"Flow not found: flow_id={flow_id}")
-            raise HTTPException(status_code=404, detail="Flow not found")
-        logger.info(f"Flow retrieved successfully: flow_id={flow_id}, name='{db_flow.name}'")
-        return db_flow
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Failed to retrieve flow: flow_id={flow_id}, error={str(e)}", exc_info=True)
-        raise
+
+    # One query either way: the ETag carries updated_at, so the database only
+    # reads flow_data when the client has no copy of this version
+    versions = etag_versions(flow_id, request.headers.get("if-none-match", ""))
+    row = db.query(
+        Flow.name,
+        Flow.description,
+        Flow.updated_at,
+        case((Flow.updated_at.in_(versions), None), else_=Flow.flow_data),
+    ).filter(Flow.id == flow_id).first()
+    if row is None:
+        logger.warning(f"Flow not found: flow_id={flow_id}")
+        raise HTTPException(status_code=404, detail="Flow not found")
+
+    name, description, updated_at, flow_data = row
+    etag = flow_etag(flow_id, updated_at)
+    if updated_at is not None and updated_at in versions:
+        logger.info(f"Flow not modified: flow_id={flow_id}")
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    logger.info(f"Flow retrieved successfully: flow_id={flow_id}, name='{name}'")
+    return FlowSchema(id=flow_id, name=name, description=description, flow_data=flow_data)
 
 @app.get("/flows/", response_model=list[FlowSchema])
-def list_flows(db: Session = Depends(get_db)):
-    """List all flows."""
-    logger.info("Retrieving all flows")
-    try:
-        flows = db.query(Flow).all()
-        logger.info(f"Retrieved {len(flows)} flow(s)")
-        return flows
-    except Exception as e:
-        logger.error(f"Failed to retrieve flows: error={str(e)}", exc_info=True)
-        raise
+def list_flows(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """List flows by id; all of them unless a page is requested with limit/offset."""
+    logger.info(f"Retrieving flows: limit={limit}, offset={offset}")
+    query = db.query(Flow).order_by(Flow.id).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    flows = query.all()
+    logger.info(f"Retrieved {len(flows)} flow(s)")
+    return flows
 
 @app.put("/flows/{flow_id}", response_model=FlowSchema)
 def update_flow(flow_id: int, flow: FlowCreate, db: Session = Depends(get_db)):
     logger.info(f"Updating flow: flow_id={flow_id}, new_name='{flow.name}'")
-    try:
-        db_flow = db.query(Flow).filter(Flow.id == flow_id).first()
-        if db_flow is None:
-            logger.warning(f"Flow not found for update: flow_id={flow_id}")
-            raise HTTPException(status_code=404, detail="Flow not found")
-
-        old_name = db_flow.name
-        db_flow.name = flow.name
-        db_flow.description = flow.description
-        db_flow.flow_data = flow.flow_data
-
-        db.commit()
-        db.refresh(db_flow)
-        logger.info(
-            f"Flow updated successfully: flow_id={flow_id}, "
-            f"old_name='{old_name}', new_name='{db_flow.name}'"
-        )
-        return db_flow
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(
-            f"Failed to update flow: flow_id={flow_id}, new_name='{flow.name}', error={str(e)}",
-            exc_info=True,
-        )
-        db.rollback()
-        raise
+    db_flow = db.get(Flow, flow_id)
+    if db_flow is None:
+        logger.warning(f"Flow not found for update: flow_id={flow_id}")
+        raise HTTPException(status_code=404, detail="Flow not found")
+
+    old_name = db_flow.name
+    db_flow.name = flow.name
+    db_flow.description = flow.description
+    db_flow.flow_data = flow.flow_data
+
+    db.commit()
+    logger.info(
+        f"Flow updated successfully: flow_id={flow_id}, "
+        f"old_name='{old_name}', new_name='{db_flow.name}'"
+    )
+    return db_flow
 
 @app.delete("/flows/{flow_id}")
 def delete_flow(flow_id: int, db: Session = Depends(get_db)):
     logger.info(f"Deleting flow: flow_id={flow_id}")
-    try:
-        db_flow = db.query(Flow).filter(Flow.id == flow_id).first()
-        if db_flow is None:
-            logger.warning(f"Flow not found for deletion: flow_id={flow_id}")
-            raise HTTPException(status_code=404, detail="Flow not found")
-
-        flow_name = db_flow.name
-        db.delete(db_flow)
-        db.commit()
-        logger.info(f"Flow deleted successfully: flow_id={flow_id}, name='{flow_name}'")
-        return {"message": "Flow deleted successfully"}
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(
-            f"Failed to delete flow: flow_id={flow_id}, error={str(e)}",
-            exc_info=True,
-        )
-        db.rollback()
-        raise
\ No newline at end of file
+    db_flow = db.get(Flow, flow_id)
+    if db_flow is None:
+        logger.warning(f"Flow not found for deletion: flow_id={flow_id}")
+        raise HTTPException(status_code=404, detail="Flow not found")
+
+    flow_name = db_flow.name
+    db.delete(db_flow)
+    db.commit()
+    logger.info(f"Flow deleted successfully: flow_id={flow_id}, name='{flow_name}'")
+    return {"message": "Flow deleted successfully"}
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, func
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from .database import Base
 from easypath_shared.constants import TableNames
@@ -14,7 +15,7 @@ class Flow(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String)
-    flow_data = Column(JSON)
+    flow_data = Column(JSONB)
     owner_id = Column(String, ForeignKey(f"{TableNames.USERS}.id"))
     owner = relationship("User", back_populates="flows")
     status = Column(String, default="draft")